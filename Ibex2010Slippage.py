@@ -25,7 +25,7 @@ from pyalgotrade.barfeed import yahoofeed
 from pyalgotrade.technical import ma, rsi, cross
 from pyalgotrade.stratanalyzer import drawdown, returns, sharpe, trades
 from pyalgotrade.utils import stats
-from pyalgoext import volatility
+from pyalgoext import volatility, risk
 import pyalgotrade.logger as logger
 import math
 import os
@@ -173,6 +173,13 @@ class MyStrategy(MyBenchmark):
                     self.prepareOrder(broker.Order.Action.SELL_SHORT, instrument, bars)
 
 
+# A metric with four decimals, scaled by the given factor, or None when it is undefined.
+def format_metric(value, factor=1):
+    if value is None:
+        return str(None)
+    return "%.4f" % (factor * value)
+
+
 def run_strategy(isBenchmark, instruments, posMax, entrySma, exitSma, rsiPeriod, overSoldThreshold, overBoughtThreshold):
     # Load the yahoo feed from the CSV file
     feed = yahoofeed.Feed()
@@ -219,29 +226,24 @@ def run_strategy(isBenchmark, instruments, posMax, entrySma, exitSma, rsiPeriod,
 
     # Show basic information
     allRet = returnsAnalyzer.getReturns()
+    report = risk.RiskReport(allRet, 0.0036)
     capEnd = myStrategy.getBroker().getEquity()
 
     myStrategy.info("CAPITAL FINAL: $%.4f" % capEnd)
     myStrategy.info(" ")
     myStrategy.info("Rentabilidad: %.4f%%" % (100 * (capEnd - capStart) / capStart))
     myStrategy.info("Rentabilidad Anualizada: %.4f%%" % (100 * (math.pow((capEnd / capStart),(365.0 / ((myStrategy.endDateTime - myStrategy.startDateTime).days))) - 1)))
-    myStrategy.info("Volatilidad Anualizada: %.4f%%" % (100 * stats.stddev(allRet, 1) * math.sqrt(252)))
+    myStrategy.info("Volatilidad Anualizada: %s%%" % format_metric(report.getVolatility(), 100))
     myStrategy.info("Ratio de Sharpe Anualizado: %.4f" % (100 * sharpeAnalyzer.getSharpeRatio(0.0036, True)))
+    myStrategy.info("Ratio de Sortino Anualizado: %s" % format_metric(report.getSortinoRatio(), 100))
+    myStrategy.info("Ratio de Calmar: %s" % format_metric(report.getCalmarRatio()))
 
     myStrategy.info("DrawDown Maximo: %.4f%%" % (100 * drawDownAnalyzer.getMaxDrawDown()))
     myStrategy.info("DrawDown Mas Largo: %s dias" % (drawDownAnalyzer.getLongestDrawDownDuration().days))
     myStrategy.info(" ")
-    myStrategy.info("Rentabilidad Media: %.4f%%" % (100 * stats.mean(allRet)))
-    posRet = []
-    negRet = []
-    allRet = returnsAnalyzer.getReturns()
-    for ret in allRet:
-        if ret > 0:
-            posRet.append(ret)
-        elif ret < 0:
-            negRet.append(ret)
-    myStrategy.info("Ganancia Media: %.4f%%" % (100 * stats.mean(posRet)))
-    myStrategy.info("Perdida Media: %.4f%%" % (100 * stats.mean(negRet)))
+    myStrategy.info("Rentabilidad Media: %s%%" % format_metric(report.getMean(), 100))
+    myStrategy.info("Ganancia Media: %s%%" % format_metric(report.getMeanGain(), 100))
+    myStrategy.info("Perdida Media: %s%%" % format_metric(report.getMeanLoss(), 100))
     myStrategy.info(" ")
     myStrategy.info("Ganancia Media por Op: $%s" % (stats.mean(tradesAnalyzer.getProfits())))
     myStrategy.info("Perdida Media por Op: $%s" % (stats.mean(tradesAnalyzer.getLosses())))
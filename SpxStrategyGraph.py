@@ -24,7 +24,7 @@ from pyalgotrade.barfeed import yahoofeed
 from pyalgotrade.technical import ma
 from pyalgotrade.stratanalyzer import drawdown, returns, sharpe, trades
 from pyalgotrade.utils import stats
-from pyalgoext import volatility
+from pyalgoext import volatility, risk
 
 class MyStrategy(strategy.BacktestingStrategy):
     def __init__(self, feed, instrument, smaShort, smaLong):
@@ -132,19 +132,12 @@ def run_strategy(index, startYear, endYear, smaShort, smaLong):
     myStrategy.info("Num Ops Gano: " + str(tradesAnalyzer.getProfitableCount()))
     myStrategy.info("Num Ops Pierdo: " + str(tradesAnalyzer.getUnprofitableCount()))
 
-    allRet = returnsAnalyzer.getReturns()
-    #print len(allRet)
-    myStrategy.info("Rent Media: " + str(stats.mean(allRet)))
-    posRet = []
-    negRet = []
-    allRet = returnsAnalyzer.getReturns()
-    for ret in allRet:
-        if ret > 0:
-            posRet.append(ret)
-        elif ret < 0:
-            negRet.append(ret)
-    myStrategy.info("Ganancia Media: " + str(stats.mean(posRet)))
-    myStrategy.info("Perdida Media: " + str(stats.mean(negRet)))
+    report = risk.RiskReport(returnsAnalyzer.getReturns(), 0.0036)
+    myStrategy.info("Rent Media: " + str(report.getMean()))
+    myStrategy.info("Ganancia Media: " + str(report.getMeanGain()))
+    myStrategy.info("Perdida Media: " + str(report.getMeanLoss()))
+    myStrategy.info("Ratio de Sortino Anualizado: " + str(report.getSortinoRatio()))
+    myStrategy.info("Ratio de Calmar: " + str(report.getCalmarRatio()))
 
     myStrategy.info("Vola Media: " + str(stats.mean(volaSeries[-60:])))
 
@@ -0,0 +1,139 @@
+# PyAlgoSamples
+# Examples using the PyAlgoTrade Library
+#
+# Copyright 2015-2017 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+# Memory held by dict-based DbBars versus ColumnarStore views
+# for a synthetic multi-field IBEX-like history, and by the BasicBars versus
+# the ColumnarBar views of db01 DbMemFeed for its prices. Run from the root of
+# the repository.
+
+from pyalgotrade import bar
+from pyalgoext import dbfeed, columnar
+from db01 import dbfeed as memdbfeed
+import datetime
+import decimal
+import random
+import tracemalloc
+
+instNum = 35
+dayNum = 15 * 252
+fields = ['PER', 'PBV', 'DPS', 'NDE'] + dbfeed.DbBar.PRICE_FIELDS
+
+instruments = ["INST%02d" % i for i in range(instNum)]
+start = datetime.datetime(2001, 1, 1)
+dates = [start + datetime.timedelta(days=i) for i in range(dayNum)]
+
+# Highs above and lows below every other price, so that bars are valid.
+ranges = {'HIGH': (100, 110), 'LOW': (0.5, 1)}
+values = [random.uniform(*ranges.get(field, (1, 100))) for i in range(dayNum * instNum) for field in fields]
+
+
+# Rows are generated on the fly the way the MySQL cursor hands them over,
+# with DECIMAL columns converted to decimal.Decimal.
+def fetch_rows():
+    ret = []
+    i = 0
+    for dateTime in dates:
+        for instrument in instruments:
+            for field in fields:
+                ret.append((dateTime, instrument, field, decimal.Decimal("%.4f" % values[i])))
+                i += 1
+    return ret
+
+
+def dict_bars():
+    ret = []
+    fieldValues = {}
+    for dateTime, instrument, field, value in fetch_rows():
+        fieldValues[field] = value
+        if len(fieldValues) == len(fields):
+            ret.append(dbfeed.DbBar(dateTime, fieldValues, bar.Frequency.DAY))
+            fieldValues = {}
+    return ret
+
+
+def columnar_bars():
+    store = columnar.build_store(fetch_rows(), fields, dbfeed.DbBar.PRICE_FIELDS, dbfeed.DbBar.PRICE_FIELD)
+    ret = []
+    for pos in range(len(store.getDates())):
+        for instrument in instruments:
+            ret.append(store.getBar(instrument, pos, bar.Frequency.DAY))
+    return ret
+
+
+# db01 Database answering the price rows of the history from memory.
+class SyntheticDatabase(memdbfeed.Database):
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def getRows(self, instrument, fromDateTime=None, toDateTime=None):
+        column = instruments.index(instrument) * len(fields) + fields.index(dbfeed.DbBar.PRICE_FIELD)
+        step = instNum * len(fields)
+        return [(dateTime, decimal.Decimal("%.4f" % values[column + i * step])) for i, dateTime in enumerate(dates)]
+
+
+class SyntheticMemFeed(memdbfeed.DbMemFeed):
+    def buildDatabase(self, config, priceField):
+        return SyntheticDatabase(config, priceField)
+
+
+def mem_feed(useColumnar):
+    feed = SyntheticMemFeed(None, dbfeed.DbBar.PRICE_FIELD, columnar=useColumnar)
+    for instrument in instruments:
+        feed.loadBars(instrument)
+    return feed
+
+
+def bar_values(bar_):
+    return (bar_.getDateTime(), float(bar_.getOpen()), float(bar_.getHigh()), float(bar_.getLow()), float(bar_.getClose()),
+            bar_.getVolume(), float(bar_.getAdjClose()), bar_.getFrequency())
+
+
+# Both DbMemFeed paths give the same bars.
+def check_mem_feeds(barNum):
+    feeds = [mem_feed(False), mem_feed(True)]
+    for feed in feeds:
+        feed.start()
+    for i in range(barNum):
+        bars = [feed.getNextBars() for feed in feeds]
+        assert bars[0].getInstruments() == bars[1].getInstruments()
+        for instrument in bars[0].getInstruments():
+            assert bar_values(bars[0][instrument]) == bar_values(bars[1][instrument])
+
+
+def measure(builder):
+    tracemalloc.start()
+    held = builder()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, peak
+
+
+check_mem_feeds(100)
+
+barNum = instNum * dayNum
+for name, builder in [("dict", dict_bars), ("columnar", columnar_bars),
+                      ("membf", lambda: mem_feed(False)), ("membf columnar", lambda: mem_feed(True))]:
+    current, peak = measure(builder)
+    print("%-15s %d bars: %.1f MB held, %.1f MB peak, %.0f bytes/bar" % (
+        name, barNum, current / 1e6, peak / 1e6, current / float(barNum)))
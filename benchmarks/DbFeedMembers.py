@@ -0,0 +1,121 @@
+# PyAlgoSamples
+# Examples using the PyAlgoTrade Library
+#
+# Copyright 2015-2017 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+# Per-bar cost of the DbFeed instrument and member bookkeeping on a synthetic
+# index, against the former list based maintenance. No database is involved.
+
+from pyalgotrade import bar
+from pyalgoext import dbfeed
+import bisect
+import datetime
+import random
+import time
+
+dayNum = 1000
+missing = 0.02
+
+
+class SyntheticDatabase(object):
+    def __init__(self, memberNum):
+        start = datetime.datetime(2001, 1, 1)
+        self.__dates = [start + datetime.timedelta(days=i) for i in range(dayNum)]
+        self.__bar = dbfeed.DbBar(start, {'OPEN': 1, 'HIGH': 1, 'LOW': 1, 'CLOSE': 1, 'VOL': 1, 'ADJ': 1}, bar.Frequency.DAY)
+
+        # Quarterly reviews replacing a tenth of the members.
+        universe = ["INST%04d" % i for i in range(memberNum * 3)]
+        members = universe[:memberNum]
+        self.__history = ([], [])
+        for i in range(0, dayNum, 63):
+            self.__history[0].append(self.__dates[i])
+            self.__history[1].append(list(members))
+            for j in range(memberNum // 10):
+                candidate = random.choice(universe)
+                if candidate not in members:
+                    members[random.randrange(memberNum)] = candidate
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def getDates(self, fromDateTime=None, toDateTime=None):
+        return self.__dates
+
+    def getMembersHistory(self, index):
+        return self.__history
+
+    def getBars(self, instruments, frequency, dateTime):
+        ret = {}
+        for instrument in instruments:
+            if random.random() > missing:
+                ret[instrument] = self.__bar
+        return ret
+
+
+class SyntheticFeed(dbfeed.DbFeed):
+    def __init__(self, memberNum):
+        self.__memberNum = memberNum
+        dbfeed.DbFeed.__init__(self, None, [])
+
+    def buildDatabase(self, config, fields):
+        return SyntheticDatabase(self.__memberNum)
+
+
+# The bookkeeping DbFeed did with plain lists.
+def legacy_run(db):
+    instruments = []
+    dates, history = db.getMembersHistory(None)
+    for dateTime in db.getDates():
+        members = []
+        for candidate in history[bisect.bisect_right(dates, dateTime) - 1]:
+            if candidate not in members:
+                members.append(candidate)
+                if candidate not in instruments:
+                    instruments.append(candidate)
+        ret = db.getBars(instruments, bar.Frequency.DAY, dateTime)
+        for i in range(len(instruments) - 1, -1, -1):
+            if instruments[i] not in ret:
+                instruments.pop(i)
+
+
+def feed_run(feed):
+    feed.start()
+    while not feed.eof():
+        feed.getNextBars()
+    feed.stop()
+
+
+for memberNum in [35, 100, 500]:
+    random.seed(memberNum)
+    feed = SyntheticFeed(memberNum)
+    feed.registerIndex('SYNTHETIC')
+    begin = time.time()
+    feed_run(feed)
+    elapsed = time.time() - begin
+
+    random.seed(memberNum)
+    begin = time.time()
+    legacy_run(SyntheticDatabase(memberNum))
+    legacyElapsed = time.time() - begin
+
+    print("%4d members: ordered sets %.1f us/bar, lists %.1f us/bar" % (
+        memberNum, 1e6 * elapsed / dayNum, 1e6 * legacyElapsed / dayNum))
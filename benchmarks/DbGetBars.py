@@ -0,0 +1,100 @@
+# PyAlgoSamples
+# Examples using the PyAlgoTrade Library
+#
+# Copyright 2015-2017 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+# Per-call cost of Database.getBars building its SQL on every call, as it did
+# before, against the SQL text cached per number of instruments, on plain and,
+# with MySQL, on prepared cursors. The backend is the first argument: mysql
+# against a local MySQL/MariaDB, or sqlite against ibex35.db.
+
+from pyalgotrade import bar
+from pyalgoext import dbfeed
+import sys
+import time
+
+configs = {
+    'mysql': {
+        'user': 'root',
+        'password': '',
+        'host': '127.0.0.1',
+        'database': 'ibex35',
+        'raise_on_warnings': True,
+    },
+    'sqlite': {
+        'database': 'ibex35.db',
+    },
+}
+
+fields = [
+    'PER',
+    'PBV',
+    'DPS',
+    'NDE'
+]
+
+index = 'IBEX35'
+dateNum = 1000
+
+
+# The database as it was, building the SQL text on every call.
+def plain_class(databaseClass):
+    class PlainDatabase(databaseClass):
+        def __init__(self, config, fields, poolSize, prepared):
+            databaseClass.__init__(self, config, fields, poolSize, prepared)
+            self.__fields = fields
+
+        def getBarsStatement(self, instNum):
+            instFields = (','.join(["%s"] * instNum))
+            sqlFields = (','.join(["%s"] * len(self.__fields)))
+
+            sql =  "select activo, criterio, valor" \
+                " from dato where fecha = %s and activo IN (%s) and criterio IN (%s)"
+            sql = sql % ('%s', instFields, sqlFields)
+            sql += " order by activo asc"
+            return sql
+    return PlainDatabase
+
+
+def measure(databaseClass, prepared):
+    db = databaseClass(configs[backend], list(fields), 0, prepared)
+    db.start()
+    dates = db.getDates()[-dateNum:]
+    members = [db.getMembers(index, dateTime) for dateTime in dates]
+
+    begin = time.time()
+    for dateTime, instruments in zip(dates, members):
+        db.getBars(instruments, bar.Frequency.DAY, dateTime)
+    elapsed = time.time() - begin
+
+    db.stop()
+    return len(dates), elapsed
+
+
+backend = 'mysql'
+if len(sys.argv) > 1:
+    backend = sys.argv[1]
+databaseClass = dbfeed.BACKENDS[backend]
+
+arms = [("plain", plain_class(databaseClass), False), ("cached", databaseClass, False)]
+if backend == 'mysql':
+    arms.append(("prepared", databaseClass, True))
+for name, armClass, prepared in arms:
+    calls, elapsed = measure(armClass, prepared)
+    print("%-10s %d calls: %.3f s, %.3f ms/call" % (name, calls, elapsed, 1000 * elapsed / calls))
@@ -0,0 +1,164 @@
+# PyAlgoSamples
+# Examples using the PyAlgoTrade Library
+#
+# Copyright 2015-2017 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+# Peak RSS of a BasicOrganizer holding a full history of rankings, as lists of
+# tuples and as CompactRanking. Each mode runs in its own process, since peak
+# RSS never goes down. ru_maxrss is in kilobytes on Linux.
+# Lazy organizers are first checked to give the same rankings as eager ones
+# when the members change between a bar and its evaluation, and the same series
+# over a plain OrganizerWindow.
+
+from pyalgotrade import dataseries
+from pyalgoext import organizers
+import datetime
+import numpy as np
+import resource
+import subprocess
+import sys
+
+memberNum = 3000
+barNum = dataseries.DEFAULT_MAX_LEN
+concepts = ['F0', 'F1', 'F2', 'F3']
+
+
+class SyntheticBar(object):
+    def __init__(self, fields):
+        self.__fields = fields
+
+    def getField(self, key):
+        return self.__fields.get(key)
+
+
+class SyntheticEvent(object):
+    def __init__(self):
+        self.__handlers = []
+
+    def subscribe(self, handler):
+        self.__handlers.append(handler)
+
+    def emit(self, *args):
+        for handler in self.__handlers:
+            handler(*args)
+
+
+class SyntheticFeed(object):
+    def __init__(self, members):
+        self.__members = members
+        self.__event = SyntheticEvent()
+
+    def getMembers(self):
+        return self.__members
+
+    def setMembers(self, members):
+        self.__members = members
+
+    def getNewValuesEvent(self):
+        return self.__event
+
+
+def run(compact, barNum):
+    members = ["INST%04d" % i for i in range(memberNum)]
+    feed = SyntheticFeed(members)
+    rules = [organizers.OrderRule(concept, i % 2 == 0) for i, concept in enumerate(concepts)]
+    organizer = organizers.BasicOrganizer(feed, organizers.BasicOrganizerWindow(feed, rules, compact=compact), barNum)
+
+    random = np.random.RandomState(0)
+    for i in range(barNum):
+        values = random.randint(0, 1000, (memberNum, len(concepts))).tolist()
+        bars = dict((instrument, SyntheticBar(dict(zip(concepts, row)))) for instrument, row in zip(members, values))
+        feed.getNewValuesEvent().emit(i, bars)
+    return organizer
+
+
+# Latest rankings of an eager and a lazy organizer, read after some of the bars,
+# with the members changing on some dates and a schedule skipping others.
+def check_lazy():
+    random = np.random.RandomState(1)
+    members = ["INST%04d" % i for i in range(20)]
+    feed = SyntheticFeed(members[:10])
+    rules = [organizers.OrderRule(concept, i % 2 == 0) for i, concept in enumerate(concepts)]
+    eager = organizers.BasicOrganizer(feed, organizers.BasicOrganizerWindow(feed, rules), schedule=organizers.EveryDaysSchedule(2))
+    lazy = organizers.BasicOrganizer(feed, organizers.BasicOrganizerWindow(feed, rules), lazy=True, schedule=organizers.EveryDaysSchedule(2))
+
+    dateTime = datetime.datetime(2016, 1, 4)
+    for i in range(100):
+        if random.rand() < 0.3:
+            feed.setMembers(sorted(random.choice(members, random.randint(1, 15), replace=False).tolist()))
+        values = random.randint(0, 10, (len(members), len(concepts))).tolist()
+        bars = dict((instrument, SyntheticBar(dict(zip(concepts, row)))) for instrument, row in zip(members, values) if random.rand() < 0.9)
+        feed.getNewValuesEvent().emit(dateTime, bars)
+        # Lazy ones only keep the last bar let through before every read.
+        if random.rand() < 0.5 and len(eager) > 0:
+            assert lazy[-1] == eager[-1]
+            assert lazy.getDateTimes()[-1] == eager.getDateTimes()[-1]
+        dateTime += datetime.timedelta(days=1)
+
+
+# Mean of the last values of a field, a window that keeps state from bar to bar.
+class MeanWindow(organizers.OrganizerWindow):
+    def __init__(self, instrument, windowSize):
+        organizers.OrganizerWindow.__init__(self, windowSize)
+        self.__instrument = instrument
+
+    def onNewValue(self, dateTime, bars):
+        value = None
+        if self.__instrument in bars:
+            value = bars[self.__instrument].getField(concepts[0])
+        organizers.OrganizerWindow.onNewValue(self, dateTime, value)
+
+    def getValue(self):
+        return self.getMean()
+
+
+# Lazy organizers over a plain OrganizerWindow get every bar, so they give the
+# same whole series as eager ones.
+def check_lazy_window():
+    random = np.random.RandomState(2)
+    feed = SyntheticFeed(["INST0000"])
+    eager = organizers.EventBasedOrganizer(feed, MeanWindow("INST0000", 3))
+    lazy = organizers.EventBasedOrganizer(feed, MeanWindow("INST0000", 3), lazy=True)
+
+    dateTime = datetime.datetime(2016, 1, 4)
+    for i in range(100):
+        bars = {}
+        if random.rand() < 0.9:
+            bars["INST0000"] = SyntheticBar({concepts[0]: random.randint(0, 10)})
+        feed.getNewValuesEvent().emit(dateTime, bars)
+        if random.rand() < 0.2:
+            assert lazy[:] == eager[:]
+            assert lazy.getDateTimes() == eager.getDateTimes()
+        dateTime += datetime.timedelta(days=1)
+    assert lazy[-1] == eager[-1]
+
+
+if len(sys.argv) > 1:
+    organizer = run(sys.argv[1] == 'compact', barNum)
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+else:
+    assert list(run(True, 5)[-1]) == run(False, 5)[-1]
+    check_lazy()
+    check_lazy_window()
+
+    peaks = {}
+    for mode in ['tuples', 'compact']:
+        peaks[mode] = int(subprocess.check_output([sys.executable, __file__, mode]))
+    print("%d members, %d rankings: peak RSS %.1f MB with tuples, %.1f MB compact" % (
+        memberNum, barNum, peaks['tuples'] / 1024.0, peaks['compact'] / 1024.0))
@@ -0,0 +1,208 @@
+# PyAlgoSamples
+# Examples using the PyAlgoTrade Library
+#
+# Copyright 2015-2017 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+# Per-bar cost of BasicOrganizerWindow against the former sort based ranking,
+# on synthetic members with missing values, ties and Decimal fields, both when
+# every value changes from bar to bar and when only a few of them do, and of
+# the scoring alone split by rule across threads.
+# Both rankings are checked to be the same on every bar before timing them.
+
+from pyalgoext import organizers
+import decimal
+import numpy as np
+import math
+import multiprocessing
+import random
+import threading
+import time
+
+barNum = 50
+checkNum = 200
+changeRate = 0.01
+
+
+class SyntheticBar(object):
+    def __init__(self, fields):
+        self.__fields = fields
+
+    def getField(self, key):
+        return self.__fields.get(key)
+
+
+class SyntheticFeed(object):
+    def __init__(self, members):
+        self.__members = members
+
+    def getMembers(self):
+        return self.__members
+
+    def setMembers(self, members):
+        self.__members = members
+
+
+# The ranking BasicOrganizerWindow did with one sort per rule.
+def legacy_ranking(members, bars, rules, groups):
+    ranking = {}
+    for instrument in members:
+        ranking[instrument] = 0
+
+    ratio = 1
+    if groups:
+        ratio = len(ranking) / float(groups)
+
+    for rule in rules:
+        concept = rule.getConcept()
+        flip = rule.isAsc()
+        weight = rule.getWeight()
+
+        score = {}
+        for instrument in members:
+            if instrument in bars:
+                score[instrument] = bars[instrument].getField(concept)
+            else:
+                score[instrument] = None
+        score = sorted(score.items(), key=(lambda item: ((item[1] is None) is flip, item[1])), reverse=flip)
+
+        lastValue = None
+        rankNum = 1
+        prevRank = 1
+        for instrument, value in score:
+            rank = rankNum
+            if value == lastValue:
+                rank = prevRank
+            if value is not None:
+                ranking[instrument] += math.ceil(rank / ratio) * weight
+            prevRank = rank
+            lastValue = value
+            rankNum += 1
+
+    return sorted(ranking.items(), key=(lambda item: item[1]), reverse=True)
+
+
+def random_value(kind):
+    if random.random() < 0.2:
+        return None
+    if kind == 0:
+        return random.randint(0, 20)
+    elif kind == 1:
+        return decimal.Decimal(random.randint(-50000, 50000)) / 100
+    return random.uniform(-10, 10)
+
+
+def random_bars(members):
+    ret = {}
+    for instrument in members:
+        if random.random() < 0.95:
+            ret[instrument] = SyntheticBar(dict(('F%d' % i, random_value(i % 3)) for i in range(4)))
+    return ret
+
+
+# The next bars, where only some of the values changed.
+def evolve_bars(bars, members, rate):
+    ret = {}
+    for instrument in members:
+        if instrument in bars and random.random() > rate:
+            fields = dict((key, bars[instrument].getField(key)) for key in ['F0', 'F1', 'F2', 'F3'])
+            for i in range(4):
+                if random.random() < rate:
+                    fields['F%d' % i] = random_value(i % 3)
+            ret[instrument] = SyntheticBar(fields)
+        elif random.random() < 0.95:
+            ret[instrument] = SyntheticBar(dict(('F%d' % i, random_value(i % 3)) for i in range(4)))
+    return ret
+
+
+def random_rules():
+    ret = []
+    for i in range(random.randint(1, 4)):
+        ret.append(organizers.OrderRule('F%d' % random.randrange(4), random.random() < 0.5, random.choice([1, 2, 0.5])))
+    return ret
+
+
+# At SORT_MEMBERS the membership change below crosses from NumPy to plain sorting.
+for memberNum in [35, organizers.SORT_MEMBERS, 500, 3000]:
+    random.seed(memberNum)
+    members = ["INST%04d" % i for i in range(memberNum)]
+    feed = SyntheticFeed(members)
+
+    for i in range(checkNum if memberNum < 3000 else checkNum // 10):
+        rules = random_rules()
+        groups = random.choice([None, 3, 10])
+        compact = random.random() < 0.5
+        window = organizers.BasicOrganizerWindow(feed, rules, groups, compact=compact, threads=random.choice([None, 2]))
+        bars = random_bars(members)
+        # A few bars with changes, then a membership change and back.
+        for j in range(6):
+            if j == 3:
+                feed.setMembers(members[:-1])
+            elif j == 5:
+                feed.setMembers(members)
+            rate = random.choice([0, changeRate, 0.3, 1])
+            bars = evolve_bars(bars, feed.getMembers(), rate)
+            window.onNewValue(None, bars)
+            legacy = legacy_ranking(feed.getMembers(), bars, rules, groups)
+            assert list(window.getValue()) == legacy
+            top = random.randint(0, 40)
+            topWindow = organizers.BasicOrganizerWindow(feed, rules, groups, top, compact)
+            topWindow.onNewValue(None, bars)
+            assert list(topWindow.getValue()) == legacy[:top]
+        feed.setMembers(members)
+
+    rules = [organizers.OrderRule('F0', True, 0.5), organizers.OrderRule('F1', True, 0.5),
+             organizers.OrderRule('F2', True), organizers.OrderRule('F3')]
+    for rate in [1, changeRate, 0]:
+        samples = [random_bars(members)]
+        for i in range(barNum - 1):
+            samples.append(evolve_bars(samples[-1], members, rate))
+
+        window = organizers.BasicOrganizerWindow(feed, rules)
+        begin = time.time()
+        for bars in samples:
+            window.onNewValue(None, bars)
+        elapsed = time.time() - begin
+
+        begin = time.time()
+        for bars in samples:
+            legacy_ranking(members, bars, rules, None)
+        legacyElapsed = time.time() - begin
+
+        print("%4d members, %3d%% changes: window %.2f ms/bar, former sort %.2f ms/bar" % (
+            memberNum, 100 * rate, 1e3 * elapsed / barNum, 1e3 * legacyElapsed / barNum))
+
+# Scoring alone, serially and split by rule across threads. Any gain needs
+# several cores, so their number is reported along.
+memberNum = 100000
+feed = SyntheticFeed(list(range(memberNum)))
+rules = [organizers.OrderRule('F%d' % i, i % 2 == 0) for i in range(8)]
+values = np.random.RandomState(0).randint(0, 1000000, (memberNum, len(rules))).astype(np.float64)
+for threads in [None, 4]:
+    window = organizers.BasicOrganizerWindow(feed, rules, threads=threads)
+    begin = time.time()
+    for i in range(5):
+        window.rebuild(feed.getMembers(), values)
+    print("%d members, %d rules, %d cores, threads %s: %.1f ms/bar" % (
+        memberNum, len(rules), multiprocessing.cpu_count(), threads, 1e3 * (time.time() - begin) / 5))
+
+# Windows built one after another share the same pool instead of starting new threads.
+threadNum = threading.active_count()
+for i in range(100):
+    organizers.BasicOrganizerWindow(feed, rules, threads=4)
+assert threading.active_count() == threadNum
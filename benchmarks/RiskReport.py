@@ -0,0 +1,125 @@
+# PyAlgoSamples
+# Examples using the PyAlgoTrade Library
+#
+# Copyright 2015-2017 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+# Cost of pyalgoext.risk.RiskReport against the loops Ibex2010Slippage and
+# SpxStrategyGraph ran over the returns before, on the daily returns of the
+# S&P 500 from 1950 to 2015. Run from the root of the repository. The report is
+# checked first against the former loops and against plain loops for the rest of
+# its metrics, which the scripts read from the analyzers or did not compute.
+
+from pyalgotrade.utils import stats
+from pyalgoext import risk
+import csv
+import math
+import time
+
+index = "^GSPC"
+window = 120
+riskFreeRate = 0.0036
+repeat = 5
+
+
+def load_returns(startYear, endYear):
+    closes = []
+    for year in range(startYear, endYear + 1):
+        with open("./data/" + index + "-" + str(year) + ".csv") as f:
+            for row in csv.DictReader(f):
+                closes.append(float(row['Adj Close']))
+    return [closes[i] / closes[i - 1] - 1 for i in range(1, len(closes))]
+
+
+# What Ibex2010Slippage and SpxStrategyGraph did, one return at a time.
+def legacy_report(allRet):
+    ret = {}
+    ret['volatility'] = stats.stddev(allRet, 1) * math.sqrt(252)
+    ret['mean'] = stats.mean(allRet)
+
+    posRet = []
+    negRet = []
+    for aReturn in allRet:
+        if aReturn > 0:
+            posRet.append(aReturn)
+        elif aReturn < 0:
+            negRet.append(aReturn)
+    ret['meanGain'] = stats.mean(posRet)
+    ret['meanLoss'] = stats.mean(negRet)
+    return ret
+
+
+# The rest of the report, one return at a time. Only used to check it.
+def reference_report(allRet):
+    ret = {}
+    excessReturns = [aReturn - (riskFreeRate / 252) for aReturn in allRet]
+    ret['sharpe'] = stats.mean(excessReturns) / stats.stddev(allRet, 1) * math.sqrt(252)
+
+    rolling = []
+    for i in range(window, len(allRet) + 1):
+        rolling.append(stats.stddev(allRet[i - window:i], 1) * math.sqrt(252))
+    ret['rolling'] = rolling
+
+    equity = 1.0
+    high = 1.0
+    maxDrawDown = 0
+    duration = 0
+    longest = 0
+    for aReturn in allRet:
+        equity *= 1 + aReturn
+        if equity >= high:
+            high = equity
+            duration = 0
+        else:
+            duration += 1
+        maxDrawDown = max(maxDrawDown, 1 - equity / high)
+        longest = max(longest, duration)
+    ret['maxDrawDown'] = maxDrawDown
+    ret['longest'] = longest
+    return ret
+
+
+allRet = load_returns(1950, 2015)
+
+report = risk.RiskReport(allRet, riskFreeRate, window=window)
+legacy = legacy_report(allRet)
+reference = reference_report(allRet)
+assert abs(report.getVolatility() - legacy['volatility']) < 1e-12
+assert abs(report.getMean() - legacy['mean']) < 1e-15
+assert abs(report.getMeanGain() - legacy['meanGain']) < 1e-15
+assert abs(report.getMeanLoss() - legacy['meanLoss']) < 1e-15
+assert abs(report.getSharpeRatio() - reference['sharpe']) < 1e-9
+assert max(abs(report.getRollingVolatility() - reference['rolling'])) < 1e-9
+assert abs(report.getMaxDrawDown() - reference['maxDrawDown']) < 1e-12
+assert report.getLongestDrawDownDuration() == reference['longest']
+
+# The scripts build the report with the default window.
+begin = time.time()
+for i in range(repeat):
+    risk.RiskReport(allRet, riskFreeRate)
+elapsed = (time.time() - begin) / repeat
+
+begin = time.time()
+for i in range(repeat):
+    legacy_report(allRet)
+legacyElapsed = (time.time() - begin) / repeat
+
+print("%d returns: report %.1f ms, former loops %.1f ms (%.1fx)" % (len(allRet), 1e3 * elapsed, 1e3 * legacyElapsed, legacyElapsed / elapsed))
+print("Volatility %.2f%%, Sharpe %.2f, Sortino %.2f, CAGR %.2f%%, Calmar %.2f, max drawdown %.2f%% over %d sessions" % (
+    100 * report.getVolatility(), report.getSharpeRatio(), report.getSortinoRatio(), 100 * report.getCAGR(),
+    report.getCalmarRatio(), 100 * report.getMaxDrawDown(), report.getLongestDrawDownDuration()))
@@ -0,0 +1,153 @@
+# PyAlgoSamples
+# Examples using the PyAlgoTrade Library
+#
+# Copyright 2015-2017 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+# Load time of visualchartfeed.Feed.addBarsFromCSV against the former row by
+# row parsing through csv.DictReader and RowParser, on a synthetic Visual Chart
+# export of minute bars, and the best time to then run through every bar. Both
+# feeds are checked to give the same bars first, daily and intraday, sanitized,
+# localized, filtered, with full precision prices and with several instruments.
+
+from pyalgotrade.barfeed import csvfeed
+from pyalgotrade import bar
+from pyalgoext import visualchartfeed
+import datetime
+import os
+import pytz
+import random
+import shutil
+import tempfile
+import time
+
+checkNum = 20000
+rowNum = 500000
+repeat = 3
+header = "<TICKER>,<PER>,<DTYYYYMMDD>,<TIME>,<OPEN>,<HIGH>,<LOW>,<CLOSE>,<VOL>,<OPENINT>"
+
+
+# A random walk of bars, one per minute of the session or one per day, with
+# some of them broken so that they need to be sanitized. Prices are rounded to
+# the given digits, or written with full precision if None.
+def write_bars(path, count, daily=False, broken=0, digits=3):
+    random.seed(count)
+    price = 20.0
+    current = datetime.datetime(2005, 1, 3, 9, 0)
+    with open(path, "w") as f:
+        f.write(header + "\n")
+        for i in range(count):
+            open_ = price
+            close = max(0.01, open_ + random.uniform(-0.05, 0.05))
+            high = max(open_, close) + random.uniform(0, 0.03)
+            low = min(open_, close) - random.uniform(0, 0.03)
+            if digits is not None:
+                close, high, low = round(close, digits), round(high, digits), round(low, digits)
+            if random.random() < broken:
+                high, low = low, high
+            timeString = "0" if daily else current.strftime("%H%M%S")
+            f.write("ACX.MC,%s,%s,%s,%r,%r,%r,%r,%d,0\n" % (
+                "D" if daily else "1", current.strftime("%Y%m%d"), timeString, open_, high, low, close, random.randint(0, 50000)))
+            price = close
+            current += datetime.timedelta(days=1) if daily else datetime.timedelta(minutes=1)
+            if current.hour >= 17 and current.minute >= 30:
+                current = datetime.datetime.combine(current.date() + datetime.timedelta(days=1), datetime.time(9, 0))
+
+
+# The Feed as it was, parsing every row through the RowParser.
+class LegacyFeed(csvfeed.BarFeed):
+    def __init__(self, timezone=None):
+        csvfeed.BarFeed.__init__(self, bar.Frequency.DAY)
+        self.__timezone = timezone
+        self.__sanitizeBars = False
+
+    def sanitizeBars(self, sanitize):
+        self.__sanitizeBars = sanitize
+
+    def barsHaveAdjClose(self):
+        return False
+
+    def addBarsFromCSV(self, instrument, path):
+        rowParser = visualchartfeed.RowParser(self.getDailyBarTime(), self.getFrequency(), self.__timezone, self.__sanitizeBars)
+        csvfeed.BarFeed.addBarsFromCSV(self, instrument, path, rowParser)
+
+
+def bar_values(bar_):
+    return (bar_.getDateTime(), bar_.getOpen(), bar_.getHigh(), bar_.getLow(), bar_.getClose(),
+            bar_.getVolume(), bar_.getAdjClose(), bar_.getFrequency())
+
+
+def all_bars(feed):
+    ret = []
+    feed.start()
+    while not feed.eof():
+        bars = feed.getNextBars()
+        for instrument in sorted(bars.getInstruments()):
+            ret.append((instrument, bar_values(bars[instrument])))
+    feed.stop()
+    return ret
+
+
+def load(feed, paths):
+    for instrument, path in paths:
+        feed.addBarsFromCSV(instrument, path)
+    return feed
+
+
+folder = tempfile.mkdtemp()
+try:
+    madrid = pytz.timezone("Europe/Madrid")
+    acx = os.path.join(folder, "ACX.txt")
+    san = os.path.join(folder, "SAN.txt")
+    for daily, broken, timezone, barFilter, digits in [(False, 0, None, None, 3), (True, 0, None, None, 3), (False, 0.1, None, None, 3),
+                                                       (False, 0, madrid, None, 3), (False, 0, None, csvfeed.DateRangeFilter(datetime.datetime(2005, 2, 1)), 3),
+                                                       (False, 0, None, None, None)]:
+        write_bars(acx, checkNum, daily, broken, digits)
+        write_bars(san, checkNum // 2, daily, broken, digits)
+        paths = [("ACX.MC", acx), ("SAN.MC", san)]
+        feeds = [visualchartfeed.Feed(timezone=timezone), LegacyFeed(timezone)]
+        for feed in feeds:
+            feed.sanitizeBars(broken > 0)
+            feed.setBarFilter(barFilter)
+        assert all_bars(load(feeds[0], paths)) == all_bars(load(feeds[1], paths))
+
+    write_bars(acx, rowNum)
+    paths = [("ACX.MC", acx)]
+    feeds = {}
+    loadElapsed = {}
+    for name, feedClass in [("bulk", visualchartfeed.Feed), ("row by row", LegacyFeed)]:
+        begin = time.time()
+        feeds[name] = load(feedClass(), paths)
+        loadElapsed[name] = time.time() - begin
+
+    # Best of several passes through every bar, taking turns once both are loaded.
+    iterElapsed = {}
+    for i in range(repeat):
+        for name, feed in feeds.items():
+            feed.reset()
+            begin = time.time()
+            feed.start()
+            while not feed.eof():
+                feed.getNextBars()
+            iterElapsed[name] = min(iterElapsed.get(name, float("inf")), time.time() - begin)
+
+    print("%d bars: load bulk %.2f s, row by row %.2f s (%.1fx). Then every bar, bulk %.2f s, row by row %.2f s" % (
+        rowNum, loadElapsed["bulk"], loadElapsed["row by row"], loadElapsed["row by row"] / loadElapsed["bulk"],
+        iterElapsed["bulk"], iterElapsed["row by row"]))
+finally:
+    shutil.rmtree(folder)
@@ -22,6 +22,7 @@ from pyalgotrade.barfeed import membf
 from pyalgotrade import bar
 from pyalgotrade import dataseries
 from pyalgotrade.utils import dt
+from pyalgoext import columnar
 
 import mysql.connector
 
@@ -40,7 +41,8 @@ class Database():
         self.__connection.close()
         self.__connection = None
 
-    def getBars(self, instrument, frequency, timezone=None, fromDateTime=None, toDateTime=None):
+    # (date, value) rows of the price of an instrument, sorted by date.
+    def getRows(self, instrument, fromDateTime=None, toDateTime=None):
         sql =  "select fecha, valor" \
             " from dato where activo = %s and criterio = %s"
 
@@ -56,31 +58,55 @@ class Database():
         sql += " order by fecha asc"
         cursor = self.__connection.cursor()
         cursor.execute(sql, args)
-        ret = []
+        ret = cursor.fetchall()
+        cursor.close()
+        return ret
 
-        for dateTime, value in cursor:
+    def getBars(self, instrument, frequency, timezone=None, fromDateTime=None, toDateTime=None):
+        ret = []
+        for dateTime, value in self.getRows(instrument, fromDateTime, toDateTime):
             if timezone:
                 dateTime = dt.localize(dateTime, timezone)
 
             ret.append(bar.BasicBar(dateTime, value, value, value, value, 0, value, frequency))
-
-        cursor.close()
         return ret
 
+    # The same prices in a ColumnarStore, the price as open, high, low, close
+    # and adjusted close, and no volume.
+    def getColumns(self, instrument, timezone=None, fromDateTime=None, toDateTime=None):
+        rows = [(dateTime, instrument, self.__priceField, value) for dateTime, value in self.getRows(instrument, fromDateTime, toDateTime)]
+
+        normalize = None
+        if timezone:
+            normalize = lambda dateTime: dt.localize(dateTime, timezone)
 
+        priceFields = [self.__priceField] * 4 + [None, self.__priceField]
+        return columnar.build_store(rows, [self.__priceField], priceFields, self.__priceField, normalize)
+
+
+# With columnar the prices of every instrument are loaded into a ColumnarStore
+# and the feed holds ColumnarBar views over it instead of BasicBars.
 class DbMemFeed(membf.BarFeed):
-    def __init__(self, config, priceField, maxLen=dataseries.DEFAULT_MAX_LEN):
+    def __init__(self, config, priceField, maxLen=dataseries.DEFAULT_MAX_LEN, columnar=False):
         membf.BarFeed.__init__(self, bar.Frequency.DAY, maxLen)
-        self.__db = Database(config, priceField)
+        self.__db = self.buildDatabase(config, priceField)
+        self.__columnar = columnar
 
     def barsHaveAdjClose(self):
         return True
 
+    def buildDatabase(self, config, priceField):
+        return Database(config, priceField)
+
     def getDatabase(self):
         return self.__db
 
     def loadBars(self, instrument, timezone=None, fromDateTime=None, toDateTime=None):
         self.__db.start()
-        bars = self.__db.getBars(instrument, self.getFrequency(), timezone, fromDateTime, toDateTime)
+        if self.__columnar:
+            store = self.__db.getColumns(instrument, timezone, fromDateTime, toDateTime)
+            bars = [store.getBar(instrument, pos, self.getFrequency()) for pos in range(len(store.getDates()))]
+        else:
+            bars = self.__db.getBars(instrument, self.getFrequency(), timezone, fromDateTime, toDateTime)
         self.addBarsFromSequence(instrument, bars)
         self.__db.stop()
@@ -0,0 +1,52 @@
+# PyAlgoSamples
+# Examples using the PyAlgoTrade Library
+#
+# Copyright 2015-2017 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+# Dumps the IBEX35 history into a local snapshot that
+# dbsnapshot.SnapshotFeed replays without a database.
+
+from pyalgoext import dbsnapshot
+
+config = {
+  'user': 'root',
+  'password': '',
+  'host': '127.0.0.1',
+  'database': 'ibex35',
+  'raise_on_warnings': True,
+}
+
+fields = [
+    'PER',
+    'PBV',
+    'DPS',
+    'NDE'
+]
+
+indices = [
+    'IBEX35'
+]
+
+startDate = None # e.g. datetime.date(2015, 06, 01)
+endDate = None
+
+dbsnapshot.export(config, "ibex35.npz", fields, None, indices, startDate, endDate)
+
+# Replay it with:
+# feed = dbsnapshot.SnapshotFeed("ibex35.npz", fields, 10, startDate, endDate)
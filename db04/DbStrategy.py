@@ -85,7 +85,7 @@ class MyBenchmark(strategy.BacktestingStrategy):
             self._positions[instrument] = self.enterLong(instrument, amount, True)
 
     def onStart(self):
-        self.startDateTime = self.getCurrentDateTime()
+        self.startDateTime = self._feed.peekDateTime()
 
     def onFinish(self, bars):
         self.endDateTime = bars.getDateTime()
@@ -106,8 +106,8 @@ class MyBenchmark(strategy.BacktestingStrategy):
 
 class MyFundamentalStrategy(MyBenchmark):
     def __init__(self, feed, posMax, capital, rules, days=None, buffer=0):
-        eventWindow = organizers.BasicOrganizerWindow(feed, rules)
-        self._organizer = organizers.BasicOrganizer(feed, eventWindow)
+        eventWindow = organizers.BasicOrganizerWindow(feed, rules, compact=True)
+        self._organizer = organizers.BasicOrganizer(feed, eventWindow, lazy=True)
 
         super(MyFundamentalStrategy, self).__init__(feed, posMax, capital)
 
@@ -28,6 +28,8 @@ import decimal
 
 warnings.simplefilter('ignore')
 
+CONCEPTS = ['PBV', 'PER', 'DPS', 'NDE', 'OPEN', 'HIGH', 'LOW', 'CLOSE', 'VOL', 'ADJ']
+
 def getList(idxCsv, index, cnx):
     cursor = cnx.cursor()
     with open(idxCsv, "rU") as fileIn:
@@ -77,7 +79,7 @@ def recordData(fileName, cnx):
         ws = wb.get_sheet_by_name(sheet)
         for y, row in enumerate(ws.rows):
             if y > 1:
-                for x, concept in enumerate(['PBV', 'PER', 'DPS', 'NDE', 'OPEN', 'HIGH', 'LOW', 'CLOSE', 'VOL', 'ADJ']):
+                for x, concept in enumerate(CONCEPTS):
                     dateTime = row[x * 2].value
                     value = row[(x * 2) + 1].value
                     if dateTime != None and not isinstance(value, str):
@@ -93,6 +95,62 @@ def recordData(fileName, cnx):
     cursor.close()
 
 
+# CREATE TABLE IF NOT EXISTS raises a warning on existing tables, which
+# becomes an error with raise_on_warnings, so existence is checked first.
+def tableExists(cursor, table):
+    cursor.execute("SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s", [table])
+    return cursor.fetchone()[0] > 0
+
+
+# Trading calendar with every date in dato, read by dbfeed.DbFeed(calendar='calendario').
+# Only missing dates are inserted, so it can be rerun after every data load
+# without the duplicate key warnings of INSERT IGNORE.
+def recordCalendar(cnx, table='calendario'):
+    cursor = cnx.cursor()
+
+    if not tableExists(cursor, table):
+        cursor.execute("CREATE TABLE %s (fecha DATE NOT NULL, PRIMARY KEY (fecha)) ENGINE = InnoDB DEFAULT CHARSET=utf8" % table)
+    cursor.execute("INSERT INTO %s (fecha) SELECT DISTINCT(d.fecha) FROM dato d"
+                   " LEFT JOIN %s c ON c.fecha = d.fecha WHERE c.fecha IS NULL" % (table, table))
+
+    cnx.commit()
+    cursor.close()
+
+
+# Materialized wide copy of dato with one column per concept, read by
+# dbfeed.DbFeed(wide='dato_ancho'). Every (activo, fecha) whose pivoted values
+# are missing or differ from dato is upserted, so back-filled and corrected
+# rows are picked up, and rows no longer in dato are deleted. With rebuild
+# the table is emptied first.
+def recordWide(cnx, rebuild=False, table='dato_ancho'):
+    cursor = cnx.cursor()
+
+    if not tableExists(cursor, table):
+        columns = ", ".join(["%s DECIMAL(25,10) NULL" % concept for concept in CONCEPTS])
+        cursor.execute("CREATE TABLE %s (activo CHAR(15) NOT NULL, fecha DATE NOT NULL, %s, "
+                       "PRIMARY KEY (activo, fecha), INDEX sesion (fecha)) ENGINE = InnoDB DEFAULT CHARSET=utf8" % (table, columns))
+    elif rebuild:
+        cursor.execute("TRUNCATE TABLE %s" % table)
+
+    pivot = ", ".join(["MAX(CASE WHEN criterio = '%s' THEN valor END) AS %s" % (concept, concept) for concept in CONCEPTS])
+    same = " AND ".join(["w.%s <=> p.%s" % (concept, concept) for concept in CONCEPTS])
+    update = ", ".join(["%s.%s = VALUES(%s)" % (table, concept, concept) for concept in CONCEPTS])
+    sql = "INSERT INTO %s (activo, fecha, %s) SELECT p.activo, p.fecha, %s" \
+          " FROM (SELECT activo, fecha, %s FROM dato GROUP BY activo, fecha) p" \
+          " LEFT JOIN %s w ON w.activo = p.activo AND w.fecha = p.fecha" \
+          " WHERE w.activo IS NULL OR NOT (%s)" \
+          " ON DUPLICATE KEY UPDATE %s"
+    cursor.execute(sql % (table, ", ".join(CONCEPTS), ", ".join(["p.%s" % concept for concept in CONCEPTS]),
+                          pivot, table, same, update))
+
+    sql = "DELETE w FROM %s w LEFT JOIN (SELECT DISTINCT activo, fecha FROM dato) d" \
+          " ON d.activo = w.activo AND d.fecha = w.fecha WHERE d.activo IS NULL"
+    cursor.execute(sql % table)
+
+    cnx.commit()
+    cursor.close()
+
+
 def validateData(cnx, cnx2):
     cursor = cnx.cursor()
     sql = "SELECT DISTINCT(activo) FROM dato"
@@ -312,6 +370,8 @@ cnx2.isolation_level = None
 
 #getList('IBEX-components.csv', 'IBEX35', cnx)
 #recordData('IBEX_DATA.xlsx', cnx)
+#recordCalendar(cnx)
+#recordWide(cnx)
 validateData(cnx, cnx2)
 
 cnx2.close()
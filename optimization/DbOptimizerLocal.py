@@ -19,6 +19,7 @@
 """
 
 DBFEED = True
+SNAPSHOT = None # e.g. "ibex35.npz" written by dbsnapshot.export
 
 from pyalgotrade import strategy, dataseries
 from pyalgotrade.technical import ma, macd, cross
@@ -27,7 +28,7 @@ import pyalgotrade.logger as logger
 import math
 from pyalgotrade import broker
 from pyalgotrade.broker import backtesting
-from pyalgoext import dbfeed
+from pyalgoext import dbfeed, dbsnapshot
 from pyalgotrade.barfeed import yahoofeed
 from pyalgotrade.talibext import indicator
 import itertools
@@ -178,7 +179,10 @@ class MyBenchmark(strategy.BacktestingStrategy):
 
 class MyBasicStrategy(MyBenchmark):
     def __init__(self, feed, config, stopPer, stopTrailing, smaShort, smaLong):
-        if config['dbfeed']:
+        if config['snapshot']:
+            feed = dbsnapshot.SnapshotFeed(config['snapshot'], [], 100, config['startDate'], config['endDate'])
+            feed.registerInstrument(config['instrument'])
+        elif config['dbfeed']:
             feed = dbfeed.DbFeed(config['db'], [], 100, config['startDate'], config['endDate'])
             feed.registerInstrument(config['instrument'])
         else:
@@ -270,6 +274,7 @@ def parameters_generator():
 
     config = {
         'dbfeed': DBFEED,
+        'snapshot': SNAPSHOT,
         'db': {'user': 'root',
                'password': 'root',
                'host': '127.0.0.1',
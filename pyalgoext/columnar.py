@@ -0,0 +1,258 @@
+# PyAlgoExt
+# Extensions to the PyAlgoTrade Library
+#
+# Copyright 2015-2016 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+import math
+import numpy as np
+from pyalgotrade import bar
+
+
+class ColumnarBar(object):
+    """A :class:`pyalgotrade.bar.Bar` that reads its prices and fields from a :class:`ColumnarStore`
+    instead of keeping copies of its own. It only holds the store, the instrument and the position.
+
+    It is registered as a virtual subclass of :class:`pyalgotrade.bar.Bar` instead of inheriting
+    from it, as the base class has no __slots__ and would give every bar a __dict__.
+    """
+
+    __slots__ = ('__store', '__instrument', '__pos', '__frequency', '__useAdjustedValue')
+
+    def __init__(self, store, instrument, pos, frequency):
+        self.__store = store
+        self.__instrument = instrument
+        self.__pos = pos
+        self.__frequency = frequency
+        self.__useAdjustedValue = False
+
+        open_, high, low, close = self.getOpen(), self.getHigh(), self.getLow(), self.getClose()
+        if high < low:
+            raise Exception("high < low on %s" % (self.getDateTime()))
+        elif high < open_:
+            raise Exception("high < open on %s" % (self.getDateTime()))
+        elif high < close:
+            raise Exception("high < close on %s" % (self.getDateTime()))
+        elif low > open_:
+            raise Exception("low > open on %s" % (self.getDateTime()))
+        elif low > close:
+            raise Exception("low > close on %s" % (self.getDateTime()))
+
+    # The price in the given position of the store's price fields, 0 if there is no field.
+    def __price(self, index):
+        field = self.__store.getPriceFields()[index]
+        if field is None:
+            return 0
+        return float(self.__store.getColumn(self.__instrument, field)[self.__pos])
+
+    def __adjusted(self, value):
+        return self.getAdjClose() * value / float(self.getClose())
+
+    def setUseAdjustedValue(self, useAdjusted):
+        self.__useAdjustedValue = useAdjusted
+
+    def getUseAdjValue(self):
+        return self.__useAdjustedValue
+
+    def getDateTime(self):
+        return self.__store.getDateTime(self.__pos)
+
+    def getOpen(self, adjusted=False):
+        if adjusted:
+            return self.__adjusted(self.__price(0))
+        return self.__price(0)
+
+    def getHigh(self, adjusted=False):
+        if adjusted:
+            return self.__adjusted(self.__price(1))
+        return self.__price(1)
+
+    def getLow(self, adjusted=False):
+        if adjusted:
+            return self.__adjusted(self.__price(2))
+        return self.__price(2)
+
+    def getClose(self, adjusted=False):
+        if adjusted:
+            return self.getAdjClose()
+        return self.__price(3)
+
+    def getVolume(self):
+        return self.__price(4)
+
+    def getAdjClose(self):
+        return self.__price(5)
+
+    def getFrequency(self):
+        return self.__frequency
+
+    def getTypicalPrice(self):
+        return (self.getHigh() + self.getLow() + self.getClose()) / 3.0
+
+    def getPrice(self):
+        if self.__useAdjustedValue:
+            return self.getAdjClose()
+        return self.getClose()
+
+    def getExtraColumns(self):
+        return {}
+
+    def getField(self, key):
+        return self.__store.getValue(self.__instrument, key, self.__pos)
+
+    def getFields(self):
+        return self.__store.getValues(self.__instrument, self.__pos)
+
+
+bar.Bar.register(ColumnarBar)
+
+
+class ColumnarStore(object):
+    """Keeps one float64 NumPy array per (instrument, field), all of them indexed
+    by the same date axis. Missing values are stored as NaN.
+
+    :param dates: the sorted date axis.
+    :type dates: list.
+    :param fields: the fields to store.
+    :type fields: list.
+    :param priceFields: the fields to use as open, high, low, close, volume and adjusted close. None stands for 0.
+    :type priceFields: list.
+    :param priceField: the field that must be present for a bar to exist.
+    :type priceField: string.
+    """
+
+    def __init__(self, dates, fields, priceFields, priceField):
+        self.__dates = list(dates)
+        self.__positions = dict((dateTime, pos) for pos, dateTime in enumerate(self.__dates))
+        self.__fields = list(fields)
+        self.__priceFields = priceFields
+        self.__priceField = priceField
+        self.__columns = {}
+        self.__instruments = []
+
+    def getDates(self):
+        return self.__dates
+
+    def getDateTime(self, pos):
+        return self.__dates[pos]
+
+    def getPosition(self, dateTime):
+        return self.__positions.get(dateTime)
+
+    def getFields(self):
+        return self.__fields
+
+    def getPriceFields(self):
+        return self.__priceFields
+
+    def getInstruments(self):
+        return self.__instruments
+
+    def getColumn(self, instrument, field):
+        return self.__columns.get((instrument, field))
+
+    def setValue(self, instrument, field, pos, value):
+        key = (instrument, field)
+        column = self.__columns.get(key)
+        if column is None:
+            column = np.empty(len(self.__dates), dtype=np.float64)
+            column.fill(np.nan)
+            self.__columns[key] = column
+            if instrument not in self.__instruments:
+                self.__instruments.append(instrument)
+        column[pos] = value
+
+    def getValue(self, instrument, field, pos):
+        column = self.__columns.get((instrument, field))
+        if column is None:
+            return None
+        value = column[pos]
+        if math.isnan(value):
+            return None
+        return float(value)
+
+    def getValues(self, instrument, pos):
+        ret = {}
+        for field in self.__fields:
+            value = self.getValue(instrument, field, pos)
+            if value is not None:
+                ret[field] = value
+        return ret
+
+    def fillForward(self, fields, seeds=()):
+        """Replaces the missing values of the given fields with the latest known value
+        of the same instrument, in place.
+
+        :param fields: the fields to fill.
+        :type fields: list.
+        :param seeds: (instrument, field, value) tuples known before the first date,
+            used to fill the values that precede the first one in the store.
+        :type seeds: list.
+        """
+
+        for instrument, field, value in seeds:
+            if instrument in self.__instruments and field in fields:
+                column = self.__columns.get((instrument, field))
+                if column is None or math.isnan(column[0]):
+                    self.setValue(instrument, field, 0, value)
+
+        positions = np.arange(len(self.__dates))
+        for instrument in self.__instruments:
+            for field in fields:
+                column = self.__columns.get((instrument, field))
+                if column is not None:
+                    # Position of the latest known value at every date.
+                    latest = np.where(np.isnan(column), 0, positions)
+                    np.maximum.accumulate(latest, out=latest)
+                    column[:] = column[latest]
+
+    def getBar(self, instrument, pos, frequency):
+        if self.getValue(instrument, self.__priceField, pos) is None:
+            return None
+        return ColumnarBar(self, instrument, pos, frequency)
+
+    def getBars(self, instruments, dateTime, frequency):
+        ret = {}
+        pos = self.getPosition(dateTime)
+        if pos is not None:
+            for instrument in instruments:
+                bar_ = self.getBar(instrument, pos, frequency)
+                if bar_ is not None:
+                    ret[instrument] = bar_
+        return ret
+
+
+def build_store(rows, fields, priceFields, priceField, normalize=None):
+    """Builds a :class:`ColumnarStore` from a list of (date, instrument, field, value) rows.
+
+    :param normalize: optional callable applied to every date before indexing.
+    """
+
+    dates = set()
+    for row in rows:
+        if normalize:
+            dates.add(normalize(row[0]))
+        else:
+            dates.add(row[0])
+
+    ret = ColumnarStore(sorted(dates), fields, priceFields, priceField)
+    for dateTime, instrument, field, value in rows:
+        if normalize:
+            dateTime = normalize(dateTime)
+        ret.setValue(instrument, field, ret.getPosition(dateTime), value)
+    return ret
@@ -21,18 +21,53 @@
 
 
 import mysql.connector
+from mysql.connector import pooling
 import pyalgotrade.bar as bars
 import pyalgotrade.barfeed as barfeed
 from pyalgotrade.barfeed import membf
 from pyalgotrade import bar
 from pyalgotrade import dataseries
 from pyalgotrade.utils import dt
+from pyalgoext import columnar
 import datetime
+import bisect
+import collections
+import os
+import sqlite3
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+DEFAULT_POOL_SIZE = 5
+# Dates per window when filling fields forward, about one year of sessions.
+DEFAULT_AS_OF_PREFETCH = 250
+
+# Connection pools shared by every Database of the process, one per config
+# and size. The process id is part of the key so that forked workers never
+# reuse the sockets of their parent.
+_pools = {}
+
+def get_pool(config, size=DEFAULT_POOL_SIZE):
+    key = (os.getpid(), repr(sorted(config.items())), size)
+    pool = _pools.get(key)
+    if pool is None:
+        pool = pooling.MySQLConnectionPool(pool_name="dbfeed%s_%s" % (os.getpid(), len(_pools)), pool_size=size, **config)
+        _pools[key] = pool
+    return pool
 
 def normalize_instrument(instrument):
     return instrument.upper()
 
 
+def normalize_datetime(dateTime):
+    if not isinstance(dateTime, datetime.datetime):
+        dateTime = datetime.datetime.combine(dateTime, datetime.time.min)
+    return dateTime
+
+
 class DbBar(bar.BasicBar):
 
     PRICE_FIELD = 'CLOSE'
@@ -57,10 +92,47 @@ class DbBar(bar.BasicBar):
         return self.__fields
 
 
-# MySQL Database
-# Timestamps are stored in UTC.
-class Database():
-    def __init__(self, config, fields):
+# The fields that are not prices, reported sparsely.
+def fundamental_fields(fields):
+    return [field for field in fields if field not in DbBar.PRICE_FIELDS]
+
+
+# Groups (date, instrument, criteria, value) rows sorted by date and instrument
+# into a dictionary of DbBars by date and instrument.
+def build_bars(rows, priceField, frequency):
+    ret = {}
+    lastDate = None
+    lastInstrument = None
+    fields = {}
+    for date, instrument, criteria, value in rows:
+        if lastInstrument is None:
+            lastDate = date
+            lastInstrument = instrument
+        if lastDate != date or lastInstrument != instrument:
+            if priceField in fields:
+                dateTime = normalize_datetime(lastDate)
+                ret.setdefault(dateTime, {})[lastInstrument] = DbBar(dateTime, fields, frequency)
+            lastDate = date
+            lastInstrument = instrument
+            fields = {}
+        fields[criteria] = value
+    if priceField in fields:
+        dateTime = normalize_datetime(lastDate)
+        ret.setdefault(dateTime, {})[lastInstrument] = DbBar(dateTime, fields, frequency)
+    return ret
+
+
+# SQL Database
+# Backend independent queries over the dato and grupo tables.
+# Subclasses provide the connection and the way statements are executed.
+# With wide set to True bars are pivoted in SQL into one row per instrument,
+# and with wide set to a table name they are read from that materialized
+# wide table, with one column per field.
+# With calendar set to a table name the trading dates are read from that
+# table instead of scanning dato on every start. The table is only read here,
+# it is built by the ingest script (see recordCalendar in db04/IBEX-components.py).
+class BaseDatabase(object):
+    def __init__(self, config, fields, wide=None, calendar=None):
         self.__instrumentIds = {}
 
         for field in DbBar.PRICE_FIELDS:
@@ -71,13 +143,30 @@ class Database():
         self.__fields = fields
         self.__sqlFields = (','.join(["%s"] * len(self.__fields)))
         self.__config = config
+        self.__wide = wide
+        self.__calendar = calendar
+        self.__statements = {}
         self.__connection = None
 
+    def getConfig(self):
+        return self.__config
+
+    def getConnection(self):
+        return self.__connection
+
+    def connect(self):
+        raise NotImplementedError()
+
+    # Runs the statement and returns all of its rows.
+    # Prepared statements may be kept open by the backend until stop().
+    def query(self, sql, args, prepared=False):
+        raise NotImplementedError()
+
     def start(self):
-        self.__connection = mysql.connector.connect(**self.__config)
-        self.__connection.isolation_level = None  # To do auto-commit
+        self.__connection = self.connect()
 
     def stop(self):
+        self.__statements = {}
         if self.__connection:
             self.__connection.close()
             self.__connection = None
@@ -86,17 +175,16 @@ class Database():
         sql = "select activo from grupo where fecha = (select max(fecha) from grupo where fecha <= %s and indice = %s) and indice = %s"
         args = [dateTime, index, index]
 
-        cursor = self.__connection.cursor()
-        cursor.execute(sql, args)
-
         ret = []
-        for row in cursor:
+        for row in self.query(sql, args):
             ret.append(row[0])
-        cursor.close()
         return ret
 
     def getDates(self, fromDateTime=None, toDateTime=None):
-        sql = "select distinct(fecha) from dato"
+        if self.__calendar:
+            sql = "select fecha from %s" % self.__calendar
+        else:
+            sql = "select distinct(fecha) from dato"
         args = []
         if fromDateTime:
             sql += " where fecha >= %s"
@@ -111,39 +199,65 @@ class Database():
 
         sql += " order by fecha asc"
 
-        cursor = self.__connection.cursor()
-        cursor.execute(sql, args)
-
         ret = []
-        for row in cursor:
-            dateTime = row[0]
-            if not isinstance(dateTime, datetime.datetime):
-                dateTime = datetime.datetime.combine(dateTime, datetime.time.min)
-            ret.append(dateTime)
-        cursor.close()
+        for row in self.query(sql, args):
+            ret.append(normalize_datetime(row[0]))
         return ret
 
+    # Whole composition history of the index as a timeline sorted by date.
+    def getMembersHistory(self, index):
+        sql = "select fecha, activo from grupo where indice = %s order by fecha asc"
+        args = [index]
+
+        dates = []
+        members = []
+        for date, instrument in self.query(sql, args):
+            dateTime = normalize_datetime(date)
+            if len(dates) == 0 or dates[-1] != dateTime:
+                dates.append(dateTime)
+                members.append([])
+            members[-1].append(instrument)
+        return dates, members
+
+    # The SQL text is built once per number of instruments and fields.
+    def getBarsStatement(self, instNum):
+        key = (instNum, len(self.__fields))
+        sql = self.__statements.get(key)
+        if sql is None:
+            instFields = (','.join(["%s"] * instNum))
+
+            if self.__wide is True:
+                pivot = ','.join(["max(case when criterio = %s then valor end)"] * len(self.__fields))
+                sql = "select activo, %s" \
+                    " from dato where fecha = %s and activo IN (%s) and criterio IN (%s) group by activo"
+                sql = sql % (pivot, '%s', instFields, self.__sqlFields)
+            elif self.__wide:
+                sql = "select activo, %s from %s where fecha = %s and activo IN (%s)"
+                sql = sql % (','.join(self.__fields), self.__wide, '%s', instFields)
+            else:
+                sql =  "select activo, criterio, valor" \
+                    " from dato where fecha = %s and activo IN (%s) and criterio IN (%s)"
+                sql = sql % ('%s', instFields, self.__sqlFields)
+            sql += " order by activo asc"
+            self.__statements[key] = sql
+        return sql
+
     def getBars(self, instruments, frequency, dateTime):
         ret = {}
         instNum = len(instruments)
         if instNum > 0:
-            instFields = (','.join(["%s"] * instNum))
+            sql = self.getBarsStatement(instNum)
 
-            sql =  "select activo, criterio, valor" \
-                " from dato where fecha = %s and activo IN (%s) and criterio IN (%s)"
-            sql = sql % ('%s', instFields, self.__sqlFields)
+            if self.__wide:
+                return self.getWideBars(sql, instruments, frequency, dateTime)
 
             args = [dateTime]
             args.extend(instruments)
             args.extend(self.__fields)
 
-            sql += " order by activo asc"
-            cursor = self.__connection.cursor()
-            cursor.execute(sql, args)
-
             lastInstrument = None
             fields = {}
-            for instrument, criteria, value in cursor:
+            for instrument, criteria, value in self.query(sql, args, True):
                 if lastInstrument is None:
                     lastInstrument = instrument
                 if lastInstrument != instrument:
@@ -154,23 +268,226 @@ class Database():
                 fields[criteria] = value
             if self.__priceField in fields:
                 ret[lastInstrument] = DbBar(dateTime, fields, frequency)
+        return ret
+
+    # One row per instrument with one value per field, in the order of the fields.
+    def getWideBars(self, sql, instruments, frequency, dateTime):
+        args = []
+        if self.__wide is True:
+            args.extend(self.__fields)
+        args.append(dateTime)
+        args.extend(instruments)
+        if self.__wide is True:
+            args.extend(self.__fields)
+
+        ret = {}
+        for row in self.query(sql, args, True):
+            fields = {}
+            for field, value in zip(self.__fields, row[1:]):
+                if value is not None:
+                    fields[field] = value
+            if self.__priceField in fields:
+                ret[row[0]] = DbBar(dateTime, fields, frequency)
+        return ret
+
+    def queryRange(self, instruments, fromDateTime, toDateTime):
+        instFields = (','.join(["%s"] * len(instruments)))
+
+        sql =  "select fecha, activo, criterio, valor" \
+            " from dato where fecha >= %s and fecha <= %s and activo IN (%s) and criterio IN (%s)"
+        sql = sql % ('%s', '%s', instFields, self.__sqlFields)
+
+        args = [fromDateTime, toDateTime]
+        args.extend(instruments)
+        args.extend(self.__fields)
+
+        sql += " order by fecha asc, activo asc"
+        return self.query(sql, args)
+
+    # Bars for a whole range of dates with a single query, grouped by date.
+    def getBarsRange(self, instruments, frequency, fromDateTime, toDateTime):
+        ret = {}
+        if len(instruments) > 0:
+            ret = build_bars(self.queryRange(instruments, fromDateTime, toDateTime), self.__priceField, frequency)
+        return ret
+
+    # Latest (instrument, field, value) of every instrument and field before the given date.
+    def getLatestValues(self, instruments, fields, dateTime):
+        if len(instruments) == 0 or len(fields) == 0:
+            return []
+
+        instFields = (','.join(["%s"] * len(instruments)))
+        sqlFields = (','.join(["%s"] * len(fields)))
+
+        sql = "select d.activo, d.criterio, d.valor from dato d join" \
+            " (select activo, criterio, max(fecha) as fecha from dato" \
+            " where activo IN (%s) and criterio IN (%s) and fecha < %s group by activo, criterio) m" \
+            " on d.activo = m.activo and d.criterio = m.criterio and d.fecha = m.fecha"
+        sql = sql % (instFields, sqlFields, '%s')
+
+        args = list(instruments)
+        args.extend(fields)
+        args.append(dateTime)
+        return self.query(sql, args)
+
+    # Same range as getBarsRange but loaded into a columnar store.
+    # With asOf the fields other than prices are filled forward with their
+    # latest known value, including the ones known before the range.
+    def getColumnsRange(self, instruments, fromDateTime, toDateTime, asOf=False):
+        rows = []
+        if len(instruments) > 0:
+            rows = self.queryRange(instruments, fromDateTime, toDateTime)
+        ret = columnar.build_store(rows, self.__fields, DbBar.PRICE_FIELDS, self.__priceField, normalize_datetime)
+        if asOf:
+            fields = fundamental_fields(self.__fields)
+            ret.fillForward(fields, self.getLatestValues(ret.getInstruments(), fields, fromDateTime))
+        return ret
+
+
+# MySQL Database
+# Timestamps are stored in UTC.
+# Prepared statements are executed through cursors that are kept open,
+# so MySQL parses each of them only once per connection.
+class Database(BaseDatabase):
+    def __init__(self, config, fields, poolSize=DEFAULT_POOL_SIZE, prepared=True, wide=None, calendar=None):
+        BaseDatabase.__init__(self, config, fields, wide, calendar)
+        self.__poolSize = poolSize
+        self.__prepared = prepared
+        self.__cursors = {}
+
+    def connect(self):
+        if self.__poolSize:
+            connection = get_pool(self.getConfig(), self.__poolSize).get_connection()
+            # Pooled connections may have been dropped by the server meanwhile.
+            connection.ping(reconnect=True, attempts=3, delay=1)
+        else:
+            connection = mysql.connector.connect(**self.getConfig())
+        connection.isolation_level = None  # To do auto-commit
+        return connection
+
+    def stop(self):
+        for cursor in self.__cursors.values():
             cursor.close()
+        self.__cursors = {}
+        BaseDatabase.stop(self)
+
+    def query(self, sql, args, prepared=False):
+        if prepared and self.__prepared:
+            cursor = self.__cursors.get(sql)
+            if cursor is None:
+                cursor = self.getConnection().cursor(prepared=True)
+                self.__cursors[sql] = cursor
+            cursor.execute(sql, args)
+            return cursor.fetchall()
+
+        cursor = self.getConnection().cursor()
+        cursor.execute(sql, args)
+        ret = cursor.fetchall()
+        cursor.close()
         return ret
 
 
+# SQLite Database
+# Same dato and grupo schema, with fecha declared as DATE.
+class SQLiteDatabase(BaseDatabase):
+    def __init__(self, config, fields, poolSize=None, prepared=True, wide=None, calendar=None):
+        BaseDatabase.__init__(self, config, fields, wide, calendar)
+
+    def connect(self):
+        connection = sqlite3.connect(detect_types=sqlite3.PARSE_DECLTYPES, **self.getConfig())
+        connection.isolation_level = None  # To do auto-commit
+        return connection
+
+    def query(self, sql, args, prepared=False):
+        # sqlite3 keeps its own cache of compiled statements.
+        return self.getConnection().execute(sql.replace("%s", "?"), self.__params(args)).fetchall()
+
+    # Dates are stored as text, so midnight datetimes must be passed as dates.
+    def __params(self, args):
+        params = []
+        for arg in args:
+            if isinstance(arg, datetime.datetime) and arg.time() == datetime.time.min:
+                arg = arg.date()
+            params.append(arg)
+        return params
+
+
+# DuckDB Database
+# Same dato and grupo schema. Range queries run on its vectorized engine.
+class DuckDBDatabase(BaseDatabase):
+    def __init__(self, config, fields, poolSize=None, prepared=True, wide=None, calendar=None):
+        BaseDatabase.__init__(self, config, fields, wide, calendar)
+
+    def connect(self):
+        import duckdb
+        return duckdb.connect(**self.getConfig())
+
+    def query(self, sql, args, prepared=False):
+        return self.getConnection().execute(sql.replace("%s", "?"), args).fetchall()
+
+
+BACKENDS = {
+    'mysql': Database,
+    'sqlite': SQLiteDatabase,
+    'duckdb': DuckDBDatabase,
+}
+
+
+# With prefetch set to a number of dates, bars are pulled window by window
+# with one range query each and served from memory. With columnar the window
+# is kept in a ColumnarStore and bars are served as ColumnarBar views.
+# Connections come from the process-wide pool unless poolSize is 0.
+# The backend is one of BACKENDS: mysql, sqlite or duckdb.
+# With wide the per-date queries read one row per instrument, see BaseDatabase.
+# With readAhead set to a number of dates, a background thread with its own
+# connection fetches the bars of the next dates while the strategy runs.
+# With calendar the dates come from a prebuilt calendar table, see BaseDatabase.
+# The dates are known from start(), so peekDateTime() answers the next one
+# and seek() jumps to any date.
+# With asOf every bar carries the latest known value of the fields other than
+# prices. They are filled forward over columnar windows, so asOf implies
+# columnar and a prefetch of DEFAULT_AS_OF_PREFETCH dates if none is given.
 class DbFeed(barfeed.BaseBarFeed):
-    def __init__(self, config, fields, maxLen=dataseries.DEFAULT_MAX_LEN, startDateTime=None, endDateTime=None):
+    def __init__(self, config, fields, maxLen=dataseries.DEFAULT_MAX_LEN, startDateTime=None, endDateTime=None, prefetch=None, columnar=False, poolSize=DEFAULT_POOL_SIZE, backend='mysql', readAhead=None, wide=None, calendar=None, asOf=False):
         barfeed.BaseBarFeed.__init__(self, bar.Frequency.DAY, maxLen)
-        self.__db = Database(config, fields)
+        self.__config = config
+        self.__fields = fields
+        self.__poolSize = poolSize
+        self.__backend = backend
+        self.__wide = wide
+        self.__calendar = calendar
+        self.__db = self.buildDatabase(config, fields)
         self.__eof = False
+        self.__dates = None
         self.__startDateTime = startDateTime
         self.__endDateTime = endDateTime
         self.__indices = []
-        self.__instruments = []
+        self.__timelines = {}
+        # Ordered sets of instruments and current members.
+        self.__instruments = collections.OrderedDict()
+        self.__memberSet = collections.OrderedDict()
+        self.__members = []
+        self.__membership = None
+        self.__restore = False
+        if asOf:
+            prefetch = prefetch or DEFAULT_AS_OF_PREFETCH
+            columnar = True
+        self.__prefetch = prefetch
+        self.__columnar = columnar
+        self.__asOf = asOf
+        self.__buffer = {}
+        self.__bufferEnd = 0
+        self.__queries = 0
+        self.__served = 0
+        self.__readAhead = readAhead
+        self.__thread = None
 
     def barsHaveAdjClose(self):
         return True
 
+    def buildDatabase(self, config, fields):
+        return BACKENDS[self.__backend](config, fields, self.__poolSize, wide=self.__wide, calendar=self.__calendar)
+
     def getDatabase(self):
         return self.__db
 
@@ -178,21 +495,57 @@ class DbFeed(barfeed.BaseBarFeed):
     def start(self):
         self.__db.start()
         self.__dates = self.__db.getDates(self.__startDateTime, self.__endDateTime)
+        for index in self.__indices:
+            self.__timelines[index] = self.__db.getMembersHistory(index)
         self.__dateTime = None
         self.__datePos = -1
+        self.__buffer = {}
+        self.__bufferEnd = 0
         self.getNextDatePos()
         self.getNextDateTime()
+        if self.__readAhead:
+            self.startReadAhead()
 
     # This should not raise.
     def stop(self):
+        if self.__thread is not None:
+            self.__stopped.set()
         self.__db.stop()
 
     def peekDateTime(self):
-        return None
+        if self.__dates is None or self.__eof:
+            return None
+        return self.__dates[self.__datePos]
+
+    def getDates(self):
+        return self.__dates
+
+    # Moves the feed to the first date on or after dateTime.
+    # Members and buffered bars are rebuilt from that date on.
+    def seek(self, dateTime):
+        if self.__thread is not None:
+            self.__stopped.set()
+            self.__thread.join()
+            self.__thread = None
+
+        self.__datePos = bisect.bisect_left(self.__dates, normalize_datetime(dateTime))
+        self.__eof = not self.__datePos < len(self.__dates)
+        self.__instruments = collections.OrderedDict()
+        self.__memberSet = collections.OrderedDict()
+        self.__members = []
+        self.__membership = None
+        self.__restore = False
+        self.__buffer = {}
+        self.__bufferEnd = 0
+        self.getNextDateTime()
+        if self.__readAhead and not self.__eof:
+            self.startReadAhead()
 
     # This should not raise.
     def join(self):
-        return None
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
 
     def eof(self):
         return self.__eof
@@ -218,30 +571,183 @@ class DbFeed(barfeed.BaseBarFeed):
     def getMembers(self):
         return self.__members
 
+    def getTimeline(self, index):
+        if index not in self.__timelines:
+            self.__timelines[index] = self.__db.getMembersHistory(index)
+        return self.__timelines[index]
+
+    def getTimelinePos(self, index, dateTime):
+        dates, members = self.getTimeline(index)
+        return bisect.bisect_right(dates, dateTime) - 1
+
+    def getIndexMembers(self, index, dateTime):
+        pos = self.getTimelinePos(index, dateTime)
+        if pos < 0:
+            return []
+        return self.getTimeline(index)[1][pos]
+
+    # Every instrument that belongs to the index at any moment between both dates.
+    def getIndexMembersRange(self, index, fromDateTime, toDateTime):
+        dates, members = self.getTimeline(index)
+        ret = collections.OrderedDict()
+        fromPos = max(bisect.bisect_right(dates, fromDateTime) - 1, 0)
+        toPos = bisect.bisect_right(dates, toDateTime)
+        for candidates in members[fromPos:toPos]:
+            for candidate in candidates:
+                ret[candidate] = None
+        return list(ret)
+
+    # Members are only rebuilt when the composition of some index changes, and
+    # instruments are only walked when members were added or went missing.
     def getNextMembers(self):
-        members = []
         if len(self.__indices) > 0:
-            for index in self.__indices:
-                candidates = self.__db.getMembers(index, self.__dateTime)
-                for candidate in candidates:
-                    if candidate not in members:
-                        members.append(candidate)
-                        if candidate not in self.__instruments:
-                            self.__instruments.append(candidate)
-            self.__members = members
+            membership = tuple([self.getTimelinePos(index, self.__dateTime) for index in self.__indices])
         else:
-            self.__members = self.getRegisteredInstruments()
-            self.__instruments = self.getRegisteredInstruments()
+            membership = len(self.getRegisteredInstruments())
+
+        if membership != self.__membership:
+            self.__membership = membership
+            members = collections.OrderedDict()
+            if len(self.__indices) > 0:
+                for index in self.__indices:
+                    for candidate in self.getIndexMembers(index, self.__dateTime):
+                        members[candidate] = None
+            else:
+                for instrument in self.getRegisteredInstruments():
+                    members[instrument] = None
+            self.__memberSet = members
+            self.__members = list(members)
+            self.__restore = True
+
+        if self.__restore:
+            if len(self.__indices) > 0:
+                for candidate in self.__memberSet:
+                    if candidate not in self.__instruments:
+                        self.__instruments[candidate] = None
+            else:
+                self.__instruments = collections.OrderedDict(self.__memberSet)
+            self.__restore = False
+
+    def getQueriesSaved(self):
+        return self.__served - self.__queries
+
+    def getPrefetchedBars(self):
+        if self.__datePos >= self.__bufferEnd:
+            self.__bufferEnd = min(self.__datePos + self.__prefetch, len(self.__dates))
+            fromDateTime = self.__dates[self.__datePos]
+            toDateTime = self.__dates[self.__bufferEnd - 1]
+
+            # Instruments that may be requested at any date of the window.
+            instruments = collections.OrderedDict(self.__instruments)
+            for index in self.__indices:
+                for candidate in self.getIndexMembersRange(index, fromDateTime, toDateTime):
+                    instruments[candidate] = None
+            instruments = list(instruments)
+
+            if self.__columnar:
+                self.__buffer = self.__db.getColumnsRange(instruments, fromDateTime, toDateTime, self.__asOf)
+            else:
+                self.__buffer = self.__db.getBarsRange(instruments, self.getFrequency(), fromDateTime, toDateTime)
+            self.__queries += 1
+
+        self.__served += 1
+        if self.__columnar:
+            return self.__buffer.getBars(self.__instruments, self.__dateTime, self.getFrequency())
+
+        window = self.__buffer.pop(self.__dateTime, {})
+        ret = {}
+        for instrument in self.__instruments:
+            if instrument in window:
+                ret[instrument] = window[instrument]
+        return ret
+
+    def startReadAhead(self):
+        self.__queue = queue.Queue(self.__readAhead)
+        self.__stopped = threading.Event()
+        self.__thread = threading.Thread(target=self.readAhead, args=(self.__datePos,))
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    # Instruments that may be requested up to the given date.
+    def getReadAheadInstruments(self, toDateTime):
+        if len(self.__indices) == 0:
+            return self.getRegisteredInstruments()
+        ret = collections.OrderedDict()
+        for index in self.__indices:
+            for candidate in self.getIndexMembersRange(index, self.__dates[0], toDateTime):
+                ret[candidate] = None
+        return list(ret)
+
+    def putReadAhead(self, item):
+        while not self.__stopped.is_set():
+            try:
+                self.__queue.put(item, True, 0.1)
+                return
+            except queue.Full:
+                pass
+
+    # Runs in the background thread. Dates are queued strictly in order.
+    def readAhead(self, datePos):
+        db = self.buildDatabase(self.__config, self.__fields)
+        try:
+            db.start()
+            window = self.__prefetch or 1
+            while datePos < len(self.__dates) and not self.__stopped.is_set():
+                endPos = min(datePos + window, len(self.__dates))
+                fromDateTime = self.__dates[datePos]
+                toDateTime = self.__dates[endPos - 1]
+                instruments = self.getReadAheadInstruments(toDateTime)
+
+                store = None
+                buffer = {}
+                if self.__columnar:
+                    store = db.getColumnsRange(instruments, fromDateTime, toDateTime, self.__asOf)
+                elif window == 1:
+                    buffer[fromDateTime] = db.getBars(instruments, self.getFrequency(), fromDateTime)
+                else:
+                    buffer = db.getBarsRange(instruments, self.getFrequency(), fromDateTime, toDateTime)
+
+                for dateTime in self.__dates[datePos:endPos]:
+                    if store is not None:
+                        self.putReadAhead((dateTime, store.getBars(instruments, dateTime, self.getFrequency())))
+                    else:
+                        self.putReadAhead((dateTime, buffer.get(dateTime, {})))
+                datePos = endPos
+        except Exception as e:
+            self.putReadAhead((None, e))
+        finally:
+            db.stop()
+
+    def getReadAheadBars(self):
+        dateTime, window = self.__queue.get()
+        if dateTime is None:
+            raise window
+        assert(dateTime == self.__dateTime)
+
+        ret = {}
+        for instrument in self.__instruments:
+            if instrument in window:
+                ret[instrument] = window[instrument]
+        return ret
 
     def getNextBars(self):
         self.getNextDateTime()
         self.getNextMembers()
 
-        ret = self.__db.getBars(self.__instruments, self.getFrequency(), self.__dateTime)
-        for i in range(len(self.__instruments) - 1, -1, -1):
-            instrument = self.__instruments[i]
-            if instrument not in ret:
-                self.__instruments.pop(i)
+        if self.__readAhead:
+            ret = self.getReadAheadBars()
+        elif self.__prefetch:
+            ret = self.getPrefetchedBars()
+        else:
+            ret = self.__db.getBars(list(self.__instruments), self.getFrequency(), self.__dateTime)
+
+        # Instruments without bar are dropped until they show up as members again.
+        if len(ret) < len(self.__instruments):
+            for instrument in list(self.__instruments):
+                if instrument not in ret:
+                    del self.__instruments[instrument]
+                    if instrument in self.__memberSet:
+                        self.__restore = True
 
         self.getNextDatePos()
 
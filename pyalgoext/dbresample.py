@@ -0,0 +1,137 @@
+# PyAlgoExt
+# Extensions to the PyAlgoTrade Library
+#
+# Copyright 2015-2016 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+import bisect
+import collections
+from pyalgotrade import bar, barfeed, dataseries
+from pyalgoext import dbfeed
+
+
+def get_period(dateTime, frequency):
+    if frequency == bar.Frequency.WEEK:
+        return dateTime.isocalendar()[:2]
+    elif frequency == bar.Frequency.MONTH:
+        return (dateTime.year, dateTime.month)
+    raise Exception("Unsupported frequency %s" % frequency)
+
+
+# The known values of a field over the daily bars, skipping the missing ones.
+def known_values(dailyBars, key):
+    return [value for value in [bar_.getField(key) for bar_ in dailyBars] if value is not None]
+
+
+# Aggregates the daily bars of one instrument, sorted by date, into a single DbBar.
+# Open is the first, high the maximum, low the minimum, volume the sum, and
+# close, adjusted close and every other field the last known value. Missing
+# values are skipped. A price missing on every day is NaN, as in the columnar
+# store, and a volume missing on every day is 0.
+def merge_bars(dateTime, dailyBars, frequency):
+    fields = {}
+    for bar_ in dailyBars:
+        for key, value in bar_.getFields().items():
+            if value is not None:
+                fields[key] = value
+
+    open_, high, low, close, volume, adjClose = dbfeed.DbBar.PRICE_FIELDS
+    for key, merge in [(open_, lambda values: values[0]), (high, max), (low, min)]:
+        values = known_values(dailyBars, key)
+        fields[key] = merge(values) if len(values) > 0 else float('nan')
+    fields[volume] = sum(known_values(dailyBars, volume))
+    return dbfeed.DbBar(dateTime, fields, frequency)
+
+
+class ResampledDbFeed(barfeed.BaseBarFeed):
+    """Wraps a :class:`pyalgoext.dbfeed.DbFeed` and emits one bar per instrument and week or month
+    instead of one per day. Every bar is stamped with the last session of its period.
+
+    :param feed: the daily feed. It must not be started.
+    :type feed: :class:`pyalgoext.dbfeed.DbFeed`.
+    :param frequency: bar.Frequency.WEEK or bar.Frequency.MONTH.
+    :param maxLen: the maximum number of values that the :class:`pyalgotrade.dataseries.bards.BarDataSeries` will hold.
+    """
+
+    def __init__(self, feed, frequency, maxLen=dataseries.DEFAULT_MAX_LEN):
+        if frequency not in (bar.Frequency.WEEK, bar.Frequency.MONTH):
+            raise Exception("Unsupported frequency %s" % frequency)
+        barfeed.BaseBarFeed.__init__(self, frequency, maxLen)
+        self.__feed = feed
+        self.__dateTime = None
+        self.__ends = []
+
+    def barsHaveAdjClose(self):
+        return self.__feed.barsHaveAdjClose()
+
+    def getFeed(self):
+        return self.__feed
+
+    def getDatabase(self):
+        return self.__feed.getDatabase()
+
+    def registerInstrument(self, instrument):
+        self.__feed.registerInstrument(instrument)
+        barfeed.BaseBarFeed.registerInstrument(self, instrument)
+
+    def registerIndex(self, index):
+        return self.__feed.registerIndex(index)
+
+    def getMembers(self):
+        return self.__feed.getMembers()
+
+    def start(self):
+        self.__feed.start()
+        # The last session of every period.
+        dates = self.__feed.getDates()
+        self.__ends = []
+        for pos, dateTime in enumerate(dates):
+            if pos + 1 == len(dates) or get_period(dates[pos + 1], self.getFrequency()) != get_period(dateTime, self.getFrequency()):
+                self.__ends.append(dateTime)
+
+    def stop(self):
+        self.__feed.stop()
+
+    def join(self):
+        self.__feed.join()
+
+    def eof(self):
+        return self.__feed.eof()
+
+    def peekDateTime(self):
+        dateTime = self.__feed.peekDateTime()
+        if dateTime is None:
+            return None
+        return self.__ends[bisect.bisect_left(self.__ends, dateTime)]
+
+    def getCurrentDateTime(self):
+        return self.__dateTime
+
+    def getNextBars(self):
+        endDateTime = self.peekDateTime()
+        dailyBars = collections.OrderedDict()
+        while not self.__feed.eof() and self.__feed.peekDateTime() <= endDateTime:
+            current = self.__feed.getNextBars()
+            for instrument in current.getInstruments():
+                dailyBars.setdefault(instrument, []).append(current[instrument])
+
+        ret = {}
+        for instrument, instrumentBars in dailyBars.items():
+            ret[instrument] = merge_bars(endDateTime, instrumentBars, self.getFrequency())
+        self.__dateTime = endDateTime
+        return bar.Bars(ret)
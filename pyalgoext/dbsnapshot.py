@@ -0,0 +1,312 @@
+# PyAlgoExt
+# Extensions to the PyAlgoTrade Library
+#
+# Copyright 2015-2016 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+import bisect
+import os
+import numpy as np
+from pyalgotrade import dataseries
+from pyalgoext import dbfeed, columnar
+
+
+######################################################################
+## Snapshots of the dato and grupo tables
+# Stored as a compressed NumPy .npz file with one array per column.
+# Instruments, criteria and indices are stored as codes into sorted
+# name arrays and dates as datetime64[D].
+# With a first date, the latest earlier value of every field other than prices
+# is stored apart in the prior arrays. They are only read to fill those fields
+# forward from the start, never replayed as bars.
+
+def _encode(values):
+    names, codes = np.unique(np.array(values, dtype=np.str_), return_inverse=True)
+    return names, codes.astype(np.int32)
+
+
+def _to_day(dateTime):
+    return np.datetime64(dateTime, 'D')
+
+
+def export(config, path, fields=None, instruments=None, indices=None, fromDateTime=None, toDateTime=None, backend='mysql'):
+    """Dumps the dato and grupo tables of a database into a snapshot file.
+
+    :param config: the connection configuration of the backend.
+    :param path: the .npz file to write.
+    :param fields: the criteria to keep. All of them if None.
+    :param instruments: the instruments to keep, on top of the members of the indices.
+    :param indices: the indices whose composition and members are kept.
+    :param fromDateTime: the first date to keep. The latest earlier value of every field other
+        than prices is kept as well, so that asOf replays start with them.
+    :param toDateTime: the last date to keep.
+    :param backend: one of :data:`pyalgoext.dbfeed.BACKENDS`.
+    """
+
+    if fields:
+        fields = list(fields) + [field for field in dbfeed.DbBar.PRICE_FIELDS if field and field not in fields]
+
+    db = dbfeed.BACKENDS[backend](config, [])
+    db.start()
+
+    grupo = []
+    instruments = list(instruments or [])
+    if indices:
+        sql = "select fecha, indice, activo from grupo where indice IN (%s)" % (','.join(["%s"] * len(indices)))
+        args = list(indices)
+        if toDateTime:
+            sql += " and fecha <= %s"
+            args.append(toDateTime)
+        grupo = db.query(sql, args)
+        for date, index, instrument in grupo:
+            if instrument not in instruments:
+                instruments.append(instrument)
+
+    dato = []
+    if instruments:
+        sql = "select fecha, activo, criterio, valor from dato where activo IN (%s)" % (','.join(["%s"] * len(instruments)))
+        args = list(instruments)
+        if fields:
+            sql += " and criterio IN (%s)" % (','.join(["%s"] * len(fields)))
+            args.extend(fields)
+        if fromDateTime:
+            sql += " and fecha >= %s"
+            args.append(fromDateTime)
+        if toDateTime:
+            sql += " and fecha <= %s"
+            args.append(toDateTime)
+        dato = db.query(sql, args)
+
+    prior = []
+    if instruments and fromDateTime:
+        # Prices are never filled forward, so only the other fields are kept.
+        operator = "IN"
+        criteria = dbfeed.fundamental_fields(fields or [])
+        if not fields:
+            operator = "NOT IN"
+            criteria = [field for field in dbfeed.DbBar.PRICE_FIELDS if field]
+        if criteria:
+            sql = "select d.fecha, d.activo, d.criterio, d.valor from dato d join" \
+                " (select activo, criterio, max(fecha) as fecha from dato" \
+                " where activo IN (%s) and criterio %s (%s) and fecha < %s group by activo, criterio) m" \
+                " on d.activo = m.activo and d.criterio = m.criterio and d.fecha = m.fecha"
+            sql = sql % (','.join(["%s"] * len(instruments)), operator, ','.join(["%s"] * len(criteria)), '%s')
+            args = list(instruments) + criteria + [fromDateTime]
+            prior = db.query(sql, args)
+
+    db.stop()
+
+    # Instrument and criteria codes are shared by all the tables.
+    rows = list(dato) + list(prior)
+    activos, activoCodes = _encode([row[1] for row in rows] + [row[2] for row in grupo])
+    criterios, criterioCodes = _encode([row[2] for row in rows])
+    indexNames, grupoIndice = _encode([row[1] for row in grupo])
+    datoNum = len(dato)
+
+    np.savez_compressed(path,
+        activos=activos,
+        criterios=criterios,
+        indices=indexNames,
+        dato_fecha=np.array([_to_day(row[0]) for row in dato], dtype='datetime64[D]'),
+        dato_activo=activoCodes[:datoNum],
+        dato_criterio=criterioCodes[:datoNum],
+        dato_valor=np.array([float(row[3]) for row in dato], dtype=np.float64),
+        prior_fecha=np.array([_to_day(row[0]) for row in prior], dtype='datetime64[D]'),
+        prior_activo=activoCodes[datoNum:len(rows)],
+        prior_criterio=criterioCodes[datoNum:],
+        prior_valor=np.array([float(row[3]) for row in prior], dtype=np.float64),
+        grupo_fecha=np.array([_to_day(row[0]) for row in grupo], dtype='datetime64[D]'),
+        grupo_indice=grupoIndice,
+        grupo_activo=activoCodes[len(rows):])
+
+
+# Snapshots loaded by this process, keyed by path and modification time, so
+# that every SnapshotDatabase on the same file shares one copy of its sorted
+# arrays and a file exported again is loaded again.
+_snapshots = {}
+
+def get_snapshot(path):
+    path = os.path.abspath(path)
+    key = (path, os.path.getmtime(path))
+    ret = _snapshots.get(key)
+    if ret is None:
+        snapshot = np.load(path)
+        try:
+            ret = {
+                'activos': snapshot['activos'],
+                'criterios': snapshot['criterios'].tolist(),
+                'indices': snapshot['indices'].tolist(),
+            }
+            # Sorted by date and instrument, as the SQL queries are.
+            for table in ['dato', 'prior']:
+                if table + '_fecha' not in snapshot.files:
+                    # Written before the prior arrays existed.
+                    ret[table] = (np.zeros(0, dtype='datetime64[D]'), np.zeros(0, dtype=np.int32),
+                        np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float64))
+                    continue
+                order = np.lexsort((snapshot[table + '_activo'], snapshot[table + '_fecha']))
+                ret[table] = tuple(snapshot[table + column][order] for column in ['_fecha', '_activo', '_criterio', '_valor'])
+
+            order = np.argsort(snapshot['grupo_fecha'], kind='mergesort')
+            ret['grupo'] = tuple(snapshot['grupo' + column][order] for column in ['_fecha', '_indice', '_activo'])
+        finally:
+            snapshot.close()
+
+        for cached in [cached for cached in _snapshots if cached[0] == path]:
+            del _snapshots[cached]
+        _snapshots[key] = ret
+    return ret
+
+
+# Snapshot Database
+# Same contract as dbfeed.Database, answered from a snapshot file in memory.
+class SnapshotDatabase():
+    def __init__(self, path, fields):
+        for field in dbfeed.DbBar.PRICE_FIELDS:
+            if field and field not in fields:
+                fields.append(field)
+        self.__priceField = dbfeed.DbBar.PRICE_FIELD
+
+        self.__fields = fields
+        self.__path = path
+        self.__histories = {}
+
+    def start(self):
+        snapshot = get_snapshot(self.__path)
+
+        self.__activos = snapshot['activos']
+        self.__activoCodes = dict((name, code) for code, name in enumerate(self.__activos.tolist()))
+        criterios = snapshot['criterios']
+        self.__criterios = criterios
+        self.__fieldCodes = [code for code, name in enumerate(criterios) if name in self.__fields]
+
+        self.__fecha, self.__activo, self.__criterio, self.__valor = snapshot['dato']
+        self.__prior = snapshot['prior']
+
+        self.__indices = snapshot['indices']
+        self.__grupoFecha, self.__grupoIndice, self.__grupoActivo = snapshot['grupo']
+
+    def stop(self):
+        self.__histories = {}
+
+    def getMembers(self, index, dateTime):
+        dates, members = self.getMembersHistory(index)
+        pos = bisect.bisect_right(dates, dbfeed.normalize_datetime(dateTime)) - 1
+        if pos < 0:
+            return []
+        return list(members[pos])
+
+    def getDates(self, fromDateTime=None, toDateTime=None):
+        lo, hi = self.__bounds(fromDateTime, toDateTime)
+        return np.unique(self.__fecha[lo:hi]).astype('datetime64[us]').tolist()
+
+    def getMembersHistory(self, index):
+        if index not in self.__histories:
+            dates = []
+            members = []
+            if index in self.__indices:
+                mask = self.__grupoIndice == self.__indices.index(index)
+                fechas = self.__grupoFecha[mask].astype('datetime64[us]').tolist()
+                activos = self.__activos[self.__grupoActivo[mask]].tolist()
+                for dateTime, instrument in zip(fechas, activos):
+                    if len(dates) == 0 or dates[-1] != dateTime:
+                        dates.append(dateTime)
+                        members.append([])
+                    members[-1].append(instrument)
+            self.__histories[index] = (dates, members)
+        return self.__histories[index]
+
+    def getBars(self, instruments, frequency, dateTime):
+        return self.getBarsRange(instruments, frequency, dateTime, dateTime).get(dbfeed.normalize_datetime(dateTime), {})
+
+    def getBarsRange(self, instruments, frequency, fromDateTime, toDateTime):
+        return dbfeed.build_bars(self.__rows(instruments, fromDateTime, toDateTime), self.__priceField, frequency)
+
+    def getLatestValues(self, instruments, fields, dateTime):
+        codes = [self.__activoCodes[instrument] for instrument in instruments if instrument in self.__activoCodes]
+        fieldCodes = [code for code, name in enumerate(self.__criterios) if name in fields]
+        if len(codes) == 0 or len(fieldCodes) == 0:
+            return []
+
+        # The values known before the snapshot first, then the ones in it.
+        activo = []
+        criterio = []
+        valor = []
+        for fecha, activos, criterios, valores in [self.__prior, (self.__fecha, self.__activo, self.__criterio, self.__valor)]:
+            hi = np.searchsorted(fecha, _to_day(dateTime), 'left')
+            pos = np.nonzero(np.isin(activos[:hi], codes) & np.isin(criterios[:hi], fieldCodes))[0]
+            activo.append(activos[pos])
+            criterio.append(criterios[pos])
+            valor.append(valores[pos])
+        activo = np.concatenate(activo)
+        criterio = np.concatenate(criterio)
+        valor = np.concatenate(valor)
+
+        # Rows are sorted by date, so the last row of every pair is the latest one.
+        keys = activo.astype(np.int64) * len(self.__criterios) + criterio
+        unique, last = np.unique(keys[::-1], return_index=True)
+        pos = len(keys) - 1 - last
+
+        activos = self.__activos[activo[pos]].tolist()
+        criterios = [self.__criterios[code] for code in criterio[pos].tolist()]
+        return list(zip(activos, criterios, valor[pos].tolist()))
+
+    def getColumnsRange(self, instruments, fromDateTime, toDateTime, asOf=False):
+        rows = self.__rows(instruments, fromDateTime, toDateTime)
+        ret = columnar.build_store(rows, self.__fields, dbfeed.DbBar.PRICE_FIELDS, self.__priceField)
+        if asOf:
+            fields = dbfeed.fundamental_fields(self.__fields)
+            ret.fillForward(fields, self.getLatestValues(ret.getInstruments(), fields, fromDateTime))
+        return ret
+
+    def __bounds(self, fromDateTime, toDateTime):
+        lo = 0
+        hi = len(self.__fecha)
+        if fromDateTime:
+            lo = np.searchsorted(self.__fecha, _to_day(fromDateTime), 'left')
+        if toDateTime:
+            hi = np.searchsorted(self.__fecha, _to_day(toDateTime), 'right')
+        return lo, hi
+
+    def __rows(self, instruments, fromDateTime, toDateTime):
+        codes = [self.__activoCodes[instrument] for instrument in instruments if instrument in self.__activoCodes]
+        if len(codes) == 0:
+            return []
+
+        lo, hi = self.__bounds(fromDateTime, toDateTime)
+        mask = np.isin(self.__activo[lo:hi], codes) & np.isin(self.__criterio[lo:hi], self.__fieldCodes)
+        pos = np.nonzero(mask)[0] + lo
+
+        fechas = self.__fecha[pos].astype('datetime64[us]').tolist()
+        activos = self.__activos[self.__activo[pos]].tolist()
+        criterios = [self.__criterios[code] for code in self.__criterio[pos].tolist()]
+        return list(zip(fechas, activos, criterios, self.__valor[pos].tolist()))
+
+
+class SnapshotFeed(dbfeed.DbFeed):
+    """A :class:`pyalgoext.dbfeed.DbFeed` that replays a snapshot file written by :func:`export`
+    instead of querying the database.
+
+    :param path: the .npz snapshot file.
+    """
+
+    def __init__(self, path, fields, maxLen=dataseries.DEFAULT_MAX_LEN, startDateTime=None, endDateTime=None, prefetch=None, columnar=False, asOf=False):
+        super(SnapshotFeed, self).__init__(path, fields, maxLen, startDateTime, endDateTime, prefetch, columnar, asOf=asOf)
+
+    def buildDatabase(self, config, fields):
+        return SnapshotDatabase(config, fields)
@@ -20,52 +20,223 @@
 """
 
 
+import collections
+import datetime
 import math
+import numpy as np
+import os
+from multiprocessing.pool import ThreadPool
 from pyalgotrade import dataseries
 
-
+NAN = float('nan')
+# Below this number of members rankings are made by plain sorting, which is
+# faster than NumPy at that size.
+SORT_MEMBERS = 150
+
+# Thread pools for scoring rules, one per number of threads, so that a window
+# built for every strategy of an optimization reuses the threads of the last
+# one instead of starting its own. Threads do not survive a fork, hence the
+# process id in the key.
+_threadPools = {}
+
+def get_thread_pool(threads):
+    key = (os.getpid(), threads)
+    pool = _threadPools.get(key)
+    if pool is None:
+        pool = ThreadPool(threads)
+        _threadPools[key] = pool
+    return pool
+
+
+# Values are kept in a preallocated ring buffer of the given dtype, along with
+# a mask of the ones that are not missing, so that None can be kept with any
+# dtype when it is not skipped. The sum, mean, minimum and maximum of the
+# values that are not missing are kept up to date on every insertion, the
+# extremes with monotonic deques. The sum is recomputed once per lap of the
+# buffer so that rounding errors do not pile up.
 class OrganizerWindow(object):
     def __init__(self, windowSize, dtype=float, skipNone=True):
         assert(windowSize > 0)
         assert(isinstance(windowSize, int))
-        self.__values = []
+        self.__values = np.zeros(windowSize, dtype=dtype)
+        self.__known = np.zeros(windowSize, dtype=bool)
         self.__windowSize = windowSize
         self.__skipNone = skipNone
+        self.__pos = 0
+        self.__count = 0
+        self.__index = 0
+        self.__sum = 0
+        self.__knownCount = 0
+        self.__mins = collections.deque()
+        self.__maxs = collections.deque()
 
     def onNewValue(self, dateTime, value):
-        if value is not None or not self.__skipNone:
-            self.__values.append(value)
-            if len(self.__values) > self.__windowSize:
-                self.__values.pop(0)
-
+        if value is None and self.__skipNone:
+            return
+
+        if self.__count == self.__windowSize:
+            if self.__known[self.__pos]:
+                self.__sum -= self.__values[self.__pos]
+                self.__knownCount -= 1
+        else:
+            self.__count += 1
+
+        if value is None:
+            self.__values[self.__pos] = 0
+            self.__known[self.__pos] = False
+        else:
+            self.__values[self.__pos] = value
+            self.__known[self.__pos] = True
+            value = self.__values[self.__pos]
+            self.__sum += value
+            self.__knownCount += 1
+            while len(self.__mins) > 0 and self.__mins[-1][1] >= value:
+                self.__mins.pop()
+            self.__mins.append((self.__index, value))
+            while len(self.__maxs) > 0 and self.__maxs[-1][1] <= value:
+                self.__maxs.pop()
+            self.__maxs.append((self.__index, value))
+
+        # Extremes that fell out of the window.
+        first = self.__index - self.__windowSize
+        while len(self.__mins) > 0 and self.__mins[0][0] <= first:
+            self.__mins.popleft()
+        while len(self.__maxs) > 0 and self.__maxs[0][0] <= first:
+            self.__maxs.popleft()
+
+        self.__index += 1
+        self.__pos = (self.__pos + 1) % self.__windowSize
+        if self.__pos == 0:
+            self.__sum = self.__values[self.__known].sum()
+
+    # A new list with the values from the oldest to the newest, None where missing.
     def getValues(self):
-        return self.__values
+        if self.__count < self.__windowSize:
+            values = self.__values[:self.__count]
+            known = self.__known[:self.__count]
+        else:
+            values = np.concatenate((self.__values[self.__pos:], self.__values[:self.__pos]))
+            known = np.concatenate((self.__known[self.__pos:], self.__known[:self.__pos]))
+        return [value if isKnown else None for value, isKnown in zip(values.tolist(), known.tolist())]
 
     def getWindowSize(self):
         return self.__windowSize
 
     def windowFull(self):
-        return len(self.__values) == self.__windowSize
+        return self.__count == self.__windowSize
+
+    def getSum(self):
+        return self.__sum
+
+    def getMean(self):
+        if self.__knownCount == 0:
+            return None
+        return self.__sum / float(self.__knownCount)
+
+    def getMin(self):
+        if len(self.__mins) == 0:
+            return None
+        return self.__mins[0][1]
+
+    def getMax(self):
+        if len(self.__maxs) == 0:
+            return None
+        return self.__maxs[0][1]
 
     def getValue(self):
         raise NotImplementedError()
 
 
+# Schedule that lets a bar through every given number of days.
+class EveryDaysSchedule(object):
+    def __init__(self, days):
+        self.__delta = datetime.timedelta(days=days)
+        self.__last = None
+
+    def __call__(self, dateTime, bars):
+        if self.__last is None or dateTime >= self.__last + self.__delta:
+            self.__last = dateTime
+            return True
+        return False
+
+
+# Schedule that lets a bar through whenever the members of the feed change.
+class MembershipSchedule(object):
+    def __init__(self, feed):
+        self.__feed = feed
+        self.__members = None
+
+    def __call__(self, dateTime, bars):
+        members = self.__feed.getMembers()
+        if self.__members is None or members != self.__members:
+            self.__members = list(members)
+            return True
+        return False
+
+
+# With a schedule, a callable taking the date and the bars, only the bars it
+# lets through are evaluated and appended. With lazy, they are only evaluated
+# when the series is read or evaluate() is called. Event windows whose value
+# only depends on the last bar, the ones with PER_BAR set such as
+# BasicOrganizerWindow, just get the last of them along with the members of
+# the feed at that time, as a third argument of onNewValue. Any other window,
+# such as an OrganizerWindow, keeps state from bar to bar, so it gets every
+# pending bar in order and the series ends up the same as without lazy.
 class EventBasedOrganizer(dataseries.SequenceDataSeries):
-    def __init__(self, dataFeed, eventWindow, maxLen=dataseries.DEFAULT_MAX_LEN):
+    def __init__(self, dataFeed, eventWindow, maxLen=dataseries.DEFAULT_MAX_LEN, lazy=False, schedule=None):
         dataseries.SequenceDataSeries.__init__(self, maxLen)
         self.__feed = dataFeed
         self.__feed.getNewValuesEvent().subscribe(self.__onNewValue)
         self.__eventWindow = eventWindow
+        self.__lazy = lazy
+        self.__perBar = getattr(eventWindow, 'PER_BAR', False)
+        self.__schedule = schedule
+        self.__pending = []
 
     def __onNewValue(self, dateTime, bars):
+        if self.__schedule is not None and not self.__schedule(dateTime, bars):
+            return
+        if self.__lazy and self.__perBar:
+            self.__pending = [(dateTime, bars, list(self.__feed.getMembers()))]
+        elif self.__lazy:
+            self.__pending.append((dateTime, bars, None))
+        else:
+            self.__evaluate(dateTime, bars)
+
+    def __evaluate(self, dateTime, bars, members=None):
         # Let the event window perform calculations.
-        self.__eventWindow.onNewValue(dateTime, bars)
+        if members is None:
+            self.__eventWindow.onNewValue(dateTime, bars)
+        else:
+            self.__eventWindow.onNewValue(dateTime, bars, members)
         # Get the resulting value
         newValue = self.__eventWindow.getValue()
         # Add the new value.
         self.appendWithDateTime(dateTime, newValue)
 
+    def evaluate(self):
+        if len(self.__pending) > 0:
+            pending = self.__pending
+            self.__pending = []
+            for dateTime, bars, members in pending:
+                self.__evaluate(dateTime, bars, members)
+
+    def __len__(self):
+        self.evaluate()
+        return dataseries.SequenceDataSeries.__len__(self)
+
+    def __getitem__(self, key):
+        self.evaluate()
+        return dataseries.SequenceDataSeries.__getitem__(self, key)
+
+    def getValues(self):
+        self.evaluate()
+        return dataseries.SequenceDataSeries.getValues(self)
+
+    def getDateTimes(self):
+        self.evaluate()
+        return dataseries.SequenceDataSeries.getDateTimes(self)
+
     def getFeed(self):
         return self.__feed
 
@@ -89,62 +260,305 @@ class OrderRule(object):
         return self.__weight
 
 
+# Scores every member on every rule in one pass.
+# signed is a members x rules matrix with NaN for missing values, where the
+# values of the rules ranked in descending order are negated. Missing values
+# take the first ranks but score nothing, tied values share the rank of the
+# first of them, and each rank scores ceil(rank / ratio) * weight.
+def rank_scores(signed, weights, ratio):
+    count = signed.shape[0]
+    if count == 0:
+        return np.zeros(signed.shape)
+
+    missing = np.isnan(signed)
+    # NaN is sorted last, but counted first through the missing offset.
+    order = np.argsort(signed, axis=0, kind='mergesort')
+    ordered = np.take_along_axis(signed, order, 0)
+
+    first = np.ones(ordered.shape, dtype=bool)
+    first[1:] = ordered[1:] != ordered[:-1]
+    tied = np.where(first, np.arange(count)[:, None], 0)
+    np.maximum.accumulate(tied, axis=0, out=tied)
+
+    ranks = np.empty(signed.shape)
+    np.put_along_axis(ranks, order, tied + 1 + missing.sum(axis=0), 0)
+    return np.where(missing, 0, np.ceil(ranks / ratio) * weights)
+
+
+# Same scores for a single rule, given the sorted values that are not missing.
+def rank_rule(column, values, weight, ratio):
+    missing = np.isnan(column)
+    ranks = np.searchsorted(values, column, 'left') + 1 + np.count_nonzero(missing)
+    return np.where(missing, 0, np.ceil(ranks / ratio) * weight)
+
+
+# Rule by rule, so that the sums are the same as adding score by score.
+def sum_scores(scores):
+    ret = np.zeros(scores.shape[0])
+    for rule in range(scores.shape[1]):
+        ret += scores[:, rule]
+    return ret
+
+
+# Same scores as rank_rule by sorting a column of the signed matrix, as a list,
+# in plain Python.
+def sort_rule(column, weight, ratio):
+    count = len(column)
+    ret = [0.0] * count
+    # NaN, the missing values, is the only value not equal to itself.
+    present = [pos for pos in range(count) if column[pos] == column[pos]]
+    present.sort(key=column.__getitem__)
+    missing = count - len(present)
+    rank = 0
+    lastValue = None
+    for k, pos in enumerate(present):
+        if k == 0 or column[pos] != lastValue:
+            rank = k + 1 + missing
+        ret[pos] = math.ceil(rank / float(ratio)) * weight
+        lastValue = column[pos]
+    return ret
+
+
+# Positions of the members by descending score, equal scores in member order.
+# With top only the leading ones are returned, selected by partition first.
+def rank_order(ranking, top=None):
+    if top is None or top >= len(ranking):
+        return np.argsort(-ranking, kind='mergesort')
+    if top <= 0:
+        return np.zeros(0, dtype=np.intp)
+
+    threshold = np.partition(ranking, len(ranking) - top)[len(ranking) - top]
+    above = np.nonzero(ranking > threshold)[0]
+    # The scores tied at the threshold get in by member order, as in a stable sort.
+    tied = np.nonzero(ranking == threshold)[0][:top - len(above)]
+    candidates = np.sort(np.concatenate((above, tied)))
+    return candidates[np.argsort(-ranking[candidates], kind='mergesort')]
+
+
+class CompactRanking(object):
+    """A ranking kept as an array of instrument ids and an array of scores instead of a list of
+    (instrument, score) tuples. It reads as that list: by position, by slice or iterating.
+
+    :param names: the instrument of every id. It may grow afterwards but must not change.
+    :type names: list.
+    :param ids: the instrument ids, in ranking order.
+    :param scores: the scores, in ranking order.
+    """
+
+    __slots__ = ('__names', '__ids', '__scores')
+
+    def __init__(self, names, ids, scores):
+        self.__names = names
+        self.__ids = ids
+        self.__scores = scores
+
+    def __len__(self):
+        return len(self.__ids)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return list(zip(self.getInstruments(key), self.__scores[key].tolist()))
+        return (self.__names[int(self.__ids[key])], float(self.__scores[key]))
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def getInstruments(self, key=slice(None)):
+        return [self.__names[id_] for id_ in self.__ids[key].tolist()]
+
+    def getScores(self):
+        return self.__scores
+
+
+# The ranking is kept between bars along with the sorted values of every rule.
+# While the members stay the same only the values that changed are moved
+# within those, only the rules with changes are scored again, and the
+# previous ranking is kept if no value changed.
+# Below SORT_MEMBERS members the rules with changes are scored again by
+# sort_rule instead, and the previous ranking is likewise kept if no value changed.
+# With top set only the leading members and their scores are kept.
+# With compact the rankings are CompactRanking instead of lists of tuples.
+# Experimental: with threads the rules are scored in parallel by a shared pool
+# of that many threads, as NumPy releases the GIL while sorting and searching.
+# Results are merged and summed in rule order, so they are the same as scoring
+# them serially. It is off by default and no gain has been measured yet: it
+# could only pay off with several cores and thousands of members, and on a
+# single core it is slightly slower than scoring serially.
 class BasicOrganizerWindow(object):
-    def __init__(self, feed, rules, groups=None):
+    # The value only depends on the last bar and members, see EventBasedOrganizer.
+    PER_BAR = True
+
+    def __init__(self, feed, rules, groups=None, top=None, compact=False, threads=None):
         self.__feed = feed
         self.__rules = rules
         self.__groups = groups
+        self.__top = top
+        self.__compact = compact
+        self.__names = []
+        self.__ids = {}
+        self.__memberIds = None
+        self.__pool = None
+        if threads:
+            self.__pool = get_thread_pool(threads)
+        self.__flips = np.array([rule.isAsc() for rule in rules], dtype=bool)
+        self.__weights = np.array([rule.getWeight() for rule in rules], dtype=np.float64)
+        self.__members = None
+        self.__signed = None
+        self.__sorted = []
+        self.__scores = None
+        self.__ruleScores = []
+        self.__ratio = 1
         self.__value = None
 
-    def onNewValue(self, dateTime, bars):
-        members = self.__feed.getMembers()
-
-        ranking = {}
-        for instrument in members:
-            ranking[instrument] = 0
-        scores = {}
-
-        ratio = 1
-        if self.__groups:
-            ratio = len(ranking) / float(self.__groups)
-
-        for rule in self.__rules:
+    # Members x rules matrix of field values, NaN where missing.
+    def getMatrix(self, members, bars):
+        memberBars = [bars[instrument] if instrument in bars else None for instrument in members]
+        ret = np.empty((len(members), len(self.__rules)))
+        for pos, rule in enumerate(self.__rules):
             concept = rule.getConcept()
-            flip = rule.isAsc()
-            weight = rule.getWeight()
-
-            score = {}
+            column = []
+            for bar in memberBars:
+                value = None
+                if bar is not None:
+                    value = bar.getField(concept)
+                # Converted one by one, which is much faster than by NumPy for Decimals.
+                column.append(NAN if value is None else float(value))
+            ret[:, pos] = column
+        return ret
+
+    def setMembers(self, members):
+        self.__members = list(members)
+        if self.__compact:
             for instrument in members:
-                if instrument in bars:
-                    bar = bars[instrument]
-                    score[instrument] = bar.getField(concept)
-                else:
-                    score[instrument] = None
-            score = sorted(score.items(), key=(lambda item: ((item[1] is None) is flip, item[1])), reverse=flip)
-            scores[concept] = score
-
-            lastValue = None
-            rankNum = 1
-            prevRank = 1
-            for instrument, value in score:
-                rank = rankNum
-                if value == lastValue:
-                    rank = prevRank
-                if value is not None:
-                    ranking[instrument] += math.ceil(rank / ratio) * weight
-                prevRank = rank
-                lastValue = value
-                rankNum += 1
-
-        ranking = sorted(ranking.items(), key=(lambda item: item[1]), reverse=True)
-        self.__value = ranking
+                if instrument not in self.__ids:
+                    self.__ids[instrument] = len(self.__names)
+                    self.__names.append(instrument)
+            self.__memberIds = np.array([self.__ids[instrument] for instrument in members], dtype=np.int32)
+        self.__ratio = 1
+        if self.__groups:
+            self.__ratio = len(members) / float(self.__groups)
+
+    def rebuild(self, members, signed):
+        self.setMembers(members)
+        if self.__pool is None:
+            self.__sorted = [np.sort(column[~np.isnan(column)]) for column in signed.T]
+            self.__scores = rank_scores(signed, self.__weights, self.__ratio)
+        else:
+            results = self.__pool.map(lambda rule: self.scoreRule(rule, signed), range(len(self.__rules)))
+            self.__sorted = [values for values, scores in results]
+            self.__scores = np.empty(signed.shape)
+            for rule, (values, scores) in enumerate(results):
+                self.__scores[:, rule] = scores
+        self.__signed = signed
+
+    # Sorted values and scores of a rule ranked from scratch.
+    def scoreRule(self, rule, signed):
+        column = signed[:, rule]
+        values = np.sort(column[~np.isnan(column)])
+        return values, rank_rule(column, values, self.__weights[rule], self.__ratio)
+
+    # Sorted values and scores of a rule after moving the values that changed.
+    def updateRule(self, rule, previous, signed, changed):
+        rows = changed[:, rule]
+        values = self.__sorted[rule]
+
+        old = np.sort(previous[rows, rule])
+        old = old[~np.isnan(old)]
+        # Tied values are removed from consecutive positions.
+        positions = np.searchsorted(values, old, 'left') + np.arange(len(old)) - np.searchsorted(old, old, 'left')
+        values = np.delete(values, positions)
+
+        new = np.sort(signed[rows, rule])
+        new = new[~np.isnan(new)]
+        values = np.insert(values, np.searchsorted(values, new, 'left'), new)
+
+        return values, rank_rule(signed[:, rule], values, self.__weights[rule], self.__ratio)
+
+    # Members x rules mask of the values that differ from the previous bar.
+    def getChanges(self, signed):
+        previous = self.__signed
+        return (signed != previous) & ~(np.isnan(signed) & np.isnan(previous))
+
+    # Returns False if no value changed.
+    def update(self, signed):
+        previous = self.__signed
+        changed = self.getChanges(signed)
+        if not changed.any():
+            return False
+
+        rules = np.nonzero(changed.any(axis=0))[0].tolist()
+        update = lambda rule: self.updateRule(rule, previous, signed, changed)
+        if self.__pool is None or len(rules) < 2:
+            results = [update(rule) for rule in rules]
+        else:
+            results = self.__pool.map(update, rules)
+
+        for rule, (values, scores) in zip(rules, results):
+            self.__sorted[rule] = values
+            self.__scores[:, rule] = scores
+
+        self.__signed = signed
+        return True
+
+    # The members default to the current ones of the feed.
+    def onNewValue(self, dateTime, bars, members=None):
+        if members is None:
+            members = self.__feed.getMembers()
+        values = self.getMatrix(members, bars)
+        signed = np.where(self.__flips, -values, values)
+
+        if len(members) < SORT_MEMBERS:
+            # The path only changes along with the members, so the matrix can be shared.
+            if self.__signed is None or members != self.__members:
+                self.setMembers(members)
+                rules = range(len(self.__rules))
+                self.__ruleScores = [None] * len(self.__rules)
+            else:
+                rules = np.nonzero(self.getChanges(signed).any(axis=0))[0].tolist()
+                if len(rules) == 0:
+                    return
+            self.__signed = signed
+
+            weights = self.__weights.tolist()
+            for rule in rules:
+                self.__ruleScores[rule] = sort_rule(signed[:, rule].tolist(), weights[rule], self.__ratio)
+            # Rule by rule, so that the sums are the same as adding score by score.
+            ranking = [0.0] * len(members)
+            for scores in self.__ruleScores:
+                ranking = [total + score for total, score in zip(ranking, scores)]
+            order = sorted(range(len(ranking)), key=lambda pos: -ranking[pos])
+            if self.__top is not None:
+                order = order[:max(self.__top, 0)]
+            if self.__compact:
+                self.__value = CompactRanking(self.__names, self.__memberIds[order], np.array([ranking[pos] for pos in order]))
+            else:
+                self.__value = [(members[pos], ranking[pos]) for pos in order]
+            return
+
+        if self.__signed is None or members != self.__members:
+            self.rebuild(members, signed)
+        elif not self.update(signed):
+            return
+
+        ranking = sum_scores(self.__scores)
+        order = rank_order(ranking, self.__top)
+        if self.__compact:
+            self.__value = CompactRanking(self.__names, self.__memberIds[order], ranking[order])
+        else:
+            self.__value = list(zip([members[pos] for pos in order.tolist()], ranking[order].tolist()))
 
     def getValue(self):
         return self.__value
 
 
 class BasicOrganizer(EventBasedOrganizer):
-    def __init__(self, feed, eventWindow, maxLen=dataseries.DEFAULT_MAX_LEN):
-        super(BasicOrganizer, self).__init__(feed, eventWindow, maxLen)
+    def __init__(self, feed, eventWindow, maxLen=dataseries.DEFAULT_MAX_LEN, lazy=False, schedule=None):
+        super(BasicOrganizer, self).__init__(feed, eventWindow, maxLen, lazy, schedule)
 
 
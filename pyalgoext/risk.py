@@ -0,0 +1,167 @@
+# PyAlgoExt
+# Extensions to the PyAlgoTrade Library
+#
+# Copyright 2015-2016 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+import math
+import numpy as np
+
+
+def _mean(values):
+    if len(values) == 0:
+        return None
+    return float(values.mean())
+
+
+# Annualized standard deviation of every window of the given number of returns,
+# from cumulative sums of the returns centered on their mean.
+def rolling_volatility(returns, window, tradingPeriods=252):
+    if window < 2 or len(returns) < window:
+        return np.zeros(0)
+    centered = returns - returns.mean()
+    sums = np.concatenate(([0], np.cumsum(centered)))
+    squares = np.concatenate(([0], np.cumsum(centered * centered)))
+    windowSums = sums[window:] - sums[:-window]
+    windowSquares = squares[window:] - squares[:-window]
+    variance = (windowSquares - windowSums * windowSums / window) / (window - 1)
+    return np.sqrt(np.maximum(variance, 0) * tradingPeriods)
+
+
+class RiskReport(object):
+    """Volatility, risk adjusted ratios, drawdown and win/loss statistics of a returns series,
+    all computed at once with NumPy.
+
+    :param returns: the returns of every period, for example the ones of a
+        :class:`pyalgotrade.stratanalyzer.returns.Returns` analyzer.
+    :type returns: list, :class:`pyalgotrade.dataseries.DataSeries` or NumPy array.
+    :param riskFreeRate: the annual risk free rate, as in :class:`pyalgotrade.stratanalyzer.sharpe.SharpeRatio`.
+    :type riskFreeRate: float.
+    :param tradingPeriods: the number of periods per year.
+    :type tradingPeriods: int.
+    :param window: the number of periods of the rolling volatility.
+    :type window: int.
+
+    Drawdowns are measured on the equity curve compounded from the returns, and their durations
+    in periods.
+    """
+
+    def __init__(self, returns, riskFreeRate=0, tradingPeriods=252, window=126):
+        if not isinstance(returns, np.ndarray):
+            returns = np.array(list(returns), dtype=np.float64)
+        self.__returns = returns
+        count = len(returns)
+        annual = math.sqrt(tradingPeriods)
+
+        self.__mean = _mean(returns)
+        self.__volatility = None
+        self.__sharpe = None
+        self.__downside = None
+        self.__sortino = None
+        if count > 1:
+            stdDev = returns.std(ddof=1)
+            excess = returns.mean() - riskFreeRate / float(tradingPeriods)
+            self.__volatility = float(stdDev * annual)
+            if stdDev != 0:
+                self.__sharpe = float(excess / stdDev * annual)
+            downside = math.sqrt(np.mean(np.minimum(returns - riskFreeRate / float(tradingPeriods), 0) ** 2))
+            self.__downside = downside * annual
+            if downside != 0:
+                self.__sortino = float(excess / downside * annual)
+        self.__rolling = rolling_volatility(returns, window, tradingPeriods)
+
+        # Equity curve starting at 1 before the first return.
+        equity = np.concatenate(([1.0], np.cumprod(1 + returns)))
+        peaks = np.maximum.accumulate(equity)
+        self.__drawDowns = 1 - equity / peaks
+        positions = np.arange(len(equity))
+        lastPeaks = np.maximum.accumulate(np.where(equity >= peaks, positions, 0))
+        self.__maxDrawDown = float(self.__drawDowns.max())
+        self.__longestDrawDown = int((positions - lastPeaks).max())
+
+        self.__cagr = None
+        self.__calmar = None
+        if count > 0 and equity[-1] > 0:
+            self.__cagr = float(equity[-1] ** (tradingPeriods / float(count)) - 1)
+            if self.__maxDrawDown > 0:
+                self.__calmar = self.__cagr / self.__maxDrawDown
+
+        gains = returns[returns > 0]
+        losses = returns[returns < 0]
+        self.__winCount = len(gains)
+        self.__lossCount = len(losses)
+        self.__evenCount = count - len(gains) - len(losses)
+        self.__meanGain = _mean(gains)
+        self.__meanLoss = _mean(losses)
+
+    def getReturns(self):
+        return self.__returns
+
+    def getMean(self):
+        return self.__mean
+
+    def getVolatility(self):
+        """Annualized standard deviation of the returns."""
+        return self.__volatility
+
+    def getRollingVolatility(self):
+        """Annualized volatility of every window of returns, as a NumPy array."""
+        return self.__rolling
+
+    def getDownsideDeviation(self):
+        """Annualized deviation of the returns below the risk free rate."""
+        return self.__downside
+
+    def getSharpeRatio(self):
+        return self.__sharpe
+
+    def getSortinoRatio(self):
+        return self.__sortino
+
+    def getCAGR(self):
+        """Compound annual growth rate."""
+        return self.__cagr
+
+    def getCalmarRatio(self):
+        return self.__calmar
+
+    def getDrawDowns(self):
+        """Drawdown after every period, as a NumPy array that starts with the initial equity."""
+        return self.__drawDowns
+
+    def getMaxDrawDown(self):
+        return self.__maxDrawDown
+
+    def getLongestDrawDownDuration(self):
+        """Longest number of periods spent below a previous peak."""
+        return self.__longestDrawDown
+
+    def getWinCount(self):
+        return self.__winCount
+
+    def getLossCount(self):
+        return self.__lossCount
+
+    def getEvenCount(self):
+        return self.__evenCount
+
+    def getMeanGain(self):
+        return self.__meanGain
+
+    def getMeanLoss(self):
+        return self.__meanLoss
@@ -27,6 +27,8 @@ from pyalgotrade import bar
 from pyalgotrade import dataseries
 
 import datetime
+import numpy as np
+import pandas as pd
 
 
 ######################################################################
@@ -91,6 +93,73 @@ class RowParser(csvfeed.RowParser):
         return bar.BasicBar(dateTime, open_, high, low, close, volume, None, self.__frequency)
 
 
+# Builds the datetimes of whole <DTYYYYMMDD> and <TIME> columns at once,
+# the same ones parse_datetime gives row by row.
+def parse_datetimes(dates, times):
+    years = dates // 10000
+    months = dates // 100 % 100
+    days = dates % 100
+    seconds = times // 10000 * 3600 + times // 100 % 100 * 60 + times % 100
+    ret = (years - 1970).astype("M8[Y]") + (months - 1).astype("m8[M]") + (days - 1).astype("m8[D]")
+
+    # NumPy rolls invalid dates over instead of rejecting them.
+    monthStart = ret.astype("M8[M]").astype("M8[D]")
+    invalid = (months < 1) | (months > 12) | (days < 1) | (ret - monthStart != (days - 1).astype("m8[D]"))
+    invalid |= (times // 10000 > 23) | (times // 100 % 100 > 59) | (times % 100 > 59)
+    if invalid.any():
+        pos = int(np.argmax(invalid))
+        raise ValueError("Invalid date %s %s" % (dates[pos], times[pos]))
+    return (ret + seconds.astype("m8[s]")).astype(object).tolist()
+
+
+class BarColumns(object):
+    """The bars of one instrument loaded from a Visual Chart file and kept as columns.
+    Every :class:`pyalgotrade.bar.BasicBar` is only built when it is requested.
+
+    :param path: The path to the CSV file.
+    :type path: string.
+    :param frequency: The frequency of the bars.
+    :param timezone: The timezone to use to localize bars.
+    :type timezone: A pytz timezone.
+    :param sanitize: True to fix the highs and lows that do not contain the open and close.
+    :type sanitize: boolean.
+    """
+
+    PRICE_COLUMNS = ["<OPEN>", "<HIGH>", "<LOW>", "<CLOSE>", "<VOL>"]
+
+    def __init__(self, path, frequency, timezone=None, sanitize=False):
+        dtype = dict((column, np.float64) for column in BarColumns.PRICE_COLUMNS)
+        dtype["<DTYYYYMMDD>"] = np.int64
+        dtype["<TIME>"] = np.int64
+        # The round trip parser gives the same floats as float(), the default one does not.
+        df = pd.read_csv(path, usecols=list(dtype.keys()), dtype=dtype, float_precision='round_trip')
+
+        # Bars sorted by datetime, keeping the file order of equal ones.
+        dates = df["<DTYYYYMMDD>"].values
+        times = df["<TIME>"].values
+        order = np.argsort(dates * 1000000 + times, kind="mergesort")
+        self.__dateTimes = parse_datetimes(dates[order], times[order])
+        if timezone:
+            self.__dateTimes = [dt.localize(dateTime, timezone) for dateTime in self.__dateTimes]
+
+        open_, high, low, close, volume = [df[column].values[order] for column in BarColumns.PRICE_COLUMNS]
+        if sanitize:
+            low = np.minimum(low, np.minimum(open_, close))
+            high = np.maximum(high, np.maximum(open_, close))
+        self.__columns = [column.tolist() for column in (open_, high, low, close, volume)]
+        self.__frequency = frequency
+
+    def __len__(self):
+        return len(self.__dateTimes)
+
+    def __getitem__(self, pos):
+        open_, high, low, close, volume = self.__columns
+        return bar.BasicBar(self.__dateTimes[pos], open_[pos], high[pos], low[pos], close[pos], volume[pos], None, self.__frequency)
+
+    def getDateTimes(self):
+        return self.__dateTimes
+
+
 class Feed(csvfeed.BarFeed):
     """A :class:`pyalgotrade.barfeed.csvfeed.BarFeed` that loads bars from CSV files downloaded from Yahoo! Finance.
 
@@ -108,6 +177,10 @@ class Feed(csvfeed.BarFeed):
 
             * If all the instruments loaded are in the same timezone, then the timezone parameter may not be specified.
             * If any of the instruments loaded are in different timezones, then the timezone parameter must be set.
+
+    .. note::
+        Files are loaded whole into :class:`BarColumns` and bars are only built as the feed reaches them.
+        With a bar filter every bar is built and checked on load instead.
     """
 
     def __init__(self, frequency=bar.Frequency.DAY, timezone=None, maxLen=dataseries.DEFAULT_MAX_LEN):
@@ -120,6 +193,14 @@ class Feed(csvfeed.BarFeed):
         csvfeed.BarFeed.__init__(self, frequency, maxLen)
         self.__timezone = timezone
         self.__sanitizeBars = False
+        # Sorted bars and their datetimes per instrument, either lists or BarColumns.
+        self.__bars = {}
+        self.__dateTimes = {}
+        self.__nextPos = {}
+        # The smallest datetime of the next bars, None once they are exhausted.
+        self.__nextDateTime = None
+        self.__started = False
+        self.__currDateTime = None
 
     def sanitizeBars(self, sanitize):
         self.__sanitizeBars = sanitize
@@ -127,6 +208,76 @@ class Feed(csvfeed.BarFeed):
     def barsHaveAdjClose(self):
         return False
 
+    def reset(self):
+        for instrument in self.__nextPos:
+            self.__nextPos[instrument] = 0
+        self.__nextDateTime = self.__findNextDateTime()
+        self.__currDateTime = None
+        csvfeed.BarFeed.reset(self)
+
+    def start(self):
+        csvfeed.BarFeed.start(self)
+        self.__started = True
+
+    def getCurrentDateTime(self):
+        return self.__currDateTime
+
+    def __addBars(self, instrument, bars, dateTimes):
+        if self.__started:
+            raise Exception("Can't add more bars once you started consuming bars")
+
+        if instrument in self.__bars:
+            bars = sorted(list(self.__bars[instrument]) + list(bars), key=lambda bar_: bar_.getDateTime())
+            dateTimes = [bar_.getDateTime() for bar_ in bars]
+        self.__bars[instrument] = bars
+        self.__dateTimes[instrument] = dateTimes
+        self.__nextPos[instrument] = 0
+        self.__nextDateTime = self.__findNextDateTime()
+        self.registerInstrument(instrument)
+
+    def addBarsFromSequence(self, instrument, bars):
+        bars = sorted(bars, key=lambda bar_: bar_.getDateTime())
+        self.__addBars(instrument, bars, [bar_.getDateTime() for bar_ in bars])
+
+    def __findNextDateTime(self):
+        ret = None
+        for instrument, dateTimes in self.__dateTimes.items():
+            nextPos = self.__nextPos[instrument]
+            if nextPos < len(dateTimes) and (ret is None or dateTimes[nextPos] < ret):
+                ret = dateTimes[nextPos]
+        return ret
+
+    def eof(self):
+        return self.__nextDateTime is None
+
+    def peekDateTime(self):
+        return self.__nextDateTime
+
+    def getNextBars(self):
+        # All bars must have the same datetime. We will return all the ones with the smallest datetime.
+        smallestDateTime = self.__nextDateTime
+        if smallestDateTime is None:
+            return None
+
+        # Find the bars and the datetime that follows them in a single pass.
+        ret = {}
+        nextDateTime = None
+        for instrument, dateTimes in self.__dateTimes.items():
+            nextPos = self.__nextPos[instrument]
+            if nextPos < len(dateTimes) and dateTimes[nextPos] == smallestDateTime:
+                ret[instrument] = self.__bars[instrument][nextPos]
+                nextPos += 1
+                self.__nextPos[instrument] = nextPos
+            if nextPos < len(dateTimes) and (nextDateTime is None or dateTimes[nextPos] < nextDateTime):
+                nextDateTime = dateTimes[nextPos]
+        self.__nextDateTime = nextDateTime
+
+        if self.__currDateTime == smallestDateTime:
+            raise Exception("Duplicate bars found for %s on %s" % (list(ret.keys()), smallestDateTime))
+
+        self.__currDateTime = smallestDateTime
+        return bar.Bars(ret)
+
     def addBarsFromCSV(self, instrument, path, timezone=None):
         """Loads bars for a given instrument from a CSV formatted file.
         The instrument gets registered in the bar feed.
@@ -145,5 +296,9 @@ class Feed(csvfeed.BarFeed):
         if timezone is None:
             timezone = self.__timezone
 
-        rowParser = RowParser(self.getDailyBarTime(), self.getFrequency(), timezone, self.__sanitizeBars)
-        csvfeed.BarFeed.addBarsFromCSV(self, instrument, path, rowParser)
+        columns = BarColumns(path, self.getFrequency(), timezone, self.__sanitizeBars)
+        barFilter = self.getBarFilter()
+        if barFilter is not None:
+            self.addBarsFromSequence(instrument, [bar_ for bar_ in columns if barFilter.includeBar(bar_)])
+        else:
+            self.__addBars(instrument, columns, columns.getDateTimes())
@@ -20,49 +20,133 @@
 """
 
 import math
-from collections import deque
 
 from pyalgotrade import stratanalyzer
 from pyalgotrade import dataseries
 from pyalgotrade.stratanalyzer import returns
-from pyalgotrade.utils import stats
+
+
+# Running mean and sum of squared deviations of a window of values.
+# Values are added, replacing the oldest one once the window is full, Welford
+# style. reset() recomputes both from the values to drop rounding errors.
+class RollingVariance(object):
+    def __init__(self):
+        self.__count = 0
+        self.__mean = 0.0
+        self.__m2 = 0.0
+
+    def add(self, value, oldest=None):
+        if oldest is None:
+            self.__count += 1
+            delta = value - self.__mean
+            self.__mean += delta / self.__count
+            self.__m2 += delta * (value - self.__mean)
+        else:
+            delta = value - oldest
+            mean = self.__mean + delta / self.__count
+            self.__m2 += delta * (value - mean + oldest - self.__mean)
+            self.__mean = mean
+
+    def reset(self, values):
+        self.__count = len(values)
+        self.__mean = math.fsum(values) / self.__count
+        self.__m2 = math.fsum([(value - self.__mean) ** 2 for value in values])
+
+    def getStdDev(self, ddof=1):
+        if self.__count <= ddof:
+            return float('nan')
+        return math.sqrt(max(self.__m2, 0) / (self.__count - ddof))
+
 
 class VolaAnalyzer(stratanalyzer.StrategyAnalyzer):
     """A :class:`pyalgotrade.stratanalyzer.StrategyAnalyzer` that calculates
     the X-sessions daily volatility ratio for the whole portfolio.
 
-    :param sessions: the number of historic sessions to consider for each daily volatility ratio.
-    :type sessions: int.
+    :param sessions: the number of historic sessions to consider for each daily volatility ratio,
+        or a list of them to calculate one volatility series per horizon.
+    :type sessions: int or list.
+
+    Every horizon reads the same buffer of daily returns. Its variance is updated in constant time
+    on every session and recomputed from scratch once every `sessions` sessions to keep rounding
+    errors bounded.
+
+    Intraday returns are compounded as they arrive. The realized volatility of every day, the
+    annualized square root of the sum of its squared returns, is kept in a separate series
+    and appended once the next day starts.
     """
 
     def __init__(self, sessions=126):
-        self.__retBuffer = []
-        self.__sessions = sessions
-        self.__returns = dataseries.SequenceDataSeries(maxLen=sessions)
-        self.__volaSeries = dataseries.SequenceDataSeries()
+        self.__compound = None
+        self.__squares = 0.0
+        if isinstance(sessions, int):
+            sessions = [sessions]
+        self.__horizons = list(sessions)
+        self.__sessions = max(self.__horizons)
+        # Ring buffer with the returns of the longest horizon.
+        self.__returns = [0.0] * self.__sessions
+        self.__pos = 0
+        self.__count = 0
+        self.__variances = {}
+        self.__volaSeries = {}
+        for horizon in self.__horizons:
+            self.__variances[horizon] = RollingVariance()
+            self.__volaSeries[horizon] = dataseries.SequenceDataSeries()
+        self.__realizedSeries = dataseries.SequenceDataSeries()
         self.__currentDate = None
 
-    def getVolaSeries(self):
-        return self.__volaSeries
+    def getHorizons(self):
+        return self.__horizons
+
+    def getVolaSeries(self, sessions=None):
+        if sessions is None:
+            sessions = self.__horizons[0]
+        return self.__volaSeries[sessions]
+
+    def getRealizedVolaSeries(self):
+        return self.__realizedSeries
 
     def beforeAttach(self, strat):
         # Get or create a shared ReturnsAnalyzerBase
         analyzer = returns.ReturnsAnalyzerBase.getOrCreateShared(strat)
         analyzer.getEvent().subscribe(self.__onReturns)
 
+    # The last returns, from the oldest to the newest.
+    def __getReturns(self, count):
+        return [self.__returns[(self.__pos - count + i) % self.__sessions] for i in range(count)]
+
+    def __addReturn(self, dateTime, value):
+        for horizon in self.__horizons:
+            oldest = None
+            if self.__count >= horizon:
+                oldest = self.__returns[(self.__pos - horizon) % self.__sessions]
+            self.__variances[horizon].add(value, oldest)
+
+        self.__returns[self.__pos] = value
+        self.__pos = (self.__pos + 1) % self.__sessions
+        self.__count += 1
+
+        for horizon in self.__horizons:
+            if self.__count % horizon == 0:
+                self.__variances[horizon].reset(self.__getReturns(horizon))
+            if self.__count >= horizon:
+                vola = self.__variances[horizon].getStdDev() * math.sqrt(252) * 100
+                self.__volaSeries[horizon].appendWithDateTime(dateTime.date(), vola)
+
     def __onReturns(self, dateTime, returnsAnalyzerBase):
         netReturn = returnsAnalyzerBase.getNetReturn()
         # Calculate daily returns.
         if dateTime.date() == self.__currentDate:
-            self.__retBuffer.append(netReturn)
+            if self.__compound is None:
+                self.__compound = netReturn
+            else:
+                self.__compound = (1 + self.__compound) * (1 + netReturn) - 1
+            self.__squares += netReturn * netReturn
         else:
-            if self.__retBuffer:
-                self.__retBuffer.append(netReturn)
-                netReturn = self.__retBuffer[0]
-                for aReturn in self.__retBuffer[1:]:
-                    netReturn = (1 + netReturn) * (1 + aReturn) - 1
-                self.__retBuffer = []
+            if self.__currentDate is not None:
+                self.__realizedSeries.appendWithDateTime(self.__currentDate, math.sqrt(self.__squares * 252) * 100)
+            self.__squares = netReturn * netReturn
+            if self.__compound is not None:
+                netReturn = (1 + self.__compound) * (1 + netReturn) - 1
+                self.__compound = None
             self.__currentDate = dateTime.date()
-            self.__returns.append(netReturn)
-            if len(self.__returns) == self.__sessions:
-                self.__volaSeries.appendWithDateTime(dateTime.date(), stats.stddev(self.__returns, 1) * math.sqrt(252) * 100)
\ No newline at end of file
+            self.__addReturn(dateTime, netReturn)